@@ -7,7 +7,9 @@ clients, and scenarios where no data is available.
 """
 
 from datetime import date
+from io import BytesIO
 from fastapi.testclient import TestClient
+from openpyxl import load_workbook
 from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
 from services import client_summary_download_service as service
 
@@ -129,3 +131,57 @@ def test_download_no_data(client: TestClient, db_session):
     }
     resp = client.post(DOWNLOAD_URL, json=payload)
     assert resp.status_code == 404
+
+
+def test_download_unknown_shift_type(client: TestClient, db_session):
+    """
+    Verify a shift type outside A/B/C/PRIME does not fail the export
+    and, as in the summary, only counts towards the total.
+    """
+    setup_data(db_session)
+    sa = db_session.query(ShiftAllowances).one()
+    db_session.add_all([
+        ShiftMapping(shiftallowance_id=sa.id, shift_type="D", days=2),
+        ShiftsAmount(shift_type="D", payroll_year=2024, amount=50),
+    ])
+    db_session.commit()
+
+    payload = {
+        "clients": "ALL",
+        "selected_year": "2024",
+        "selected_months": ["01"],
+    }
+    resp = client.post(DOWNLOAD_URL, json=payload)
+    assert resp.status_code == 200
+
+    ws = load_workbook(BytesIO(resp.content)).active
+    header, row = list(ws.values)
+    row = dict(zip(header, row))
+    assert row["Shift A"] == 500
+    assert row["Total Allowance"] == 600
+
+
+def test_download_rows_keep_stored_order(client: TestClient, db_session):
+    """
+    Verify export rows follow the order the records were stored in.
+    """
+    setup_data(db_session)
+    d = date(2024, 1, 1)
+    for emp_id, dept in (("E02", "Ops"), ("E03", "Admin")):
+        sa = ShiftAllowances(emp_id=emp_id, emp_name="User", client="ClientA",
+                             department=dept, duration_month=d, payroll_month=d)
+        db_session.add(sa)
+        db_session.flush()
+        db_session.add(ShiftMapping(shiftallowance_id=sa.id, shift_type="A", days=1))
+    db_session.commit()
+
+    payload = {
+        "clients": "ALL",
+        "selected_year": "2024",
+        "selected_months": ["01"],
+    }
+    resp = client.post(DOWNLOAD_URL, json=payload)
+    assert resp.status_code == 200
+
+    ws = load_workbook(BytesIO(resp.content)).active
+    assert [r[2] for r in list(ws.values)[1:]] == ["IT", "Ops", "Admin"]
@@ -7,7 +7,8 @@ specific clients, as well as error handling for invalid inputs.
 """
 
 from datetime import date
-from models.models import ShiftAllowances
+from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from services.data_version import bump_data_version
 
 # API ROUTES
 CLIENT_SUMMARY_URL = "/client-summary"
@@ -102,3 +103,61 @@ def test_client_summary_invalid_quarter(client):
     resp = client.post(CLIENT_SUMMARY_URL, json=payload)
     assert resp.status_code == 400
     assert "Invalid quarter" in resp.text
+
+
+def seed_priced_summary_data(db):
+    """
+    Seed one employee with 2 days of shift A in 2024-01 at a rate of 100.
+
+    Args:
+        db: Database session fixture.
+    """
+    db.query(ShiftMapping).delete(); db.query(ShiftsAmount).delete()
+    db.query(ShiftAllowances).delete(); db.commit()
+    sa = ShiftAllowances(emp_id="E01", emp_name="User", client="ClientA", department="IT",
+                         duration_month=date(2024, 1, 1), payroll_month=date(2024, 2, 1))
+    db.add(sa); db.commit()
+    db.add(ShiftMapping(shiftallowance_id=sa.id, shift_type="A", days=2))
+    db.add(ShiftsAmount(shift_type="A", payroll_year="2024", amount=100)); db.commit()
+
+
+PRICED_PAYLOAD = {"clients": "ALL", "selected_year": "2024", "selected_months": ["01"]}
+
+
+def test_client_summary_reflects_rate_edit(client, db_session):
+    """
+    Verify an edited rate is not served from a summary cached
+    with the old rate.
+    """
+    seed_priced_summary_data(db_session)
+
+    resp = client.post(CLIENT_SUMMARY_URL, json=PRICED_PAYLOAD)
+    assert resp.json()["2024-01"]["month_total"]["total_allowance"] == 200
+
+    db_session.query(ShiftsAmount).update({ShiftsAmount.amount: 200})
+    db_session.commit()
+    bump_data_version()
+
+    resp = client.post(CLIENT_SUMMARY_URL, json=PRICED_PAYLOAD)
+    assert resp.json()["2024-01"]["month_total"]["total_allowance"] == 400
+
+
+def test_client_summary_reflects_shift_update(client, db_session):
+    """
+    Verify a shift edit through /display/update is not served
+    from a previously cached summary.
+    """
+    seed_priced_summary_data(db_session)
+
+    resp = client.post(CLIENT_SUMMARY_URL, json=PRICED_PAYLOAD)
+    assert resp.json()["2024-01"]["month_total"]["total_allowance"] == 200
+
+    resp = client.put(
+        "/display/update",
+        params={"emp_id": "E01", "duration_month": "2024-01", "payroll_month": "2024-02"},
+        json={"shift_a": "3"},
+    )
+    assert resp.status_code == 200
+
+    resp = client.post(CLIENT_SUMMARY_URL, json=PRICED_PAYLOAD)
+    assert resp.json()["2024-01"]["month_total"]["total_allowance"] == 300
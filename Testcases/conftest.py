@@ -11,6 +11,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
 from db import Base, get_db
+from services.client_summary_service import cache as summary_cache
+from services.dashboard_service import response_cache as dashboard_cache
+from services.rates_cache import invalidate_rates
 from utils.dependencies import get_current_user
 
 # pylint: disable=too-few-public-methods, redefined-builtin
@@ -64,6 +67,11 @@ def db_session():
     Provide a transactional database session for tests.
     Rolls back after each test.
     """
+    # Shift rates and chart/summary responses are cached across requests;
+    # make each test read its own rows.
+    invalidate_rates()
+    summary_cache.clear()
+    dashboard_cache.clear()
     db = TestingSessionLocal()
     try:
         yield db
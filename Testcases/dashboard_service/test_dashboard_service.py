@@ -9,6 +9,7 @@ successful responses and input validation errors.
 from datetime import date
 from fastapi.testclient import TestClient
 from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from services.data_version import bump_data_version
 
 # API ROUTES
 DASHBOARD_URL = "/dashboard/client-allowance-summary"
@@ -83,3 +84,115 @@ def test_dashboard_start_after_end_error(client: TestClient):
     resp = client.post(DASHBOARD_URL, json=payload)
     assert resp.status_code == 400
     assert "less than or equal" in resp.json()["detail"]
+
+
+# /dashboard/graph API TESTCASES
+
+def test_graph_reflects_rate_edit(client: TestClient, db_session):
+    """
+    Verify the cached graph is not served after a rate edit.
+    """
+    seed_dashboard_data(db_session)
+    params = {"client_name": "ClientA", "start_month": "2024-01"}
+    resp = client.get("/dashboard/graph", params=params)
+    assert resp.json()["graph"] == {"Jan": 500}
+
+    db_session.query(ShiftsAmount).update({ShiftsAmount.amount: 200})
+    db_session.commit()
+    bump_data_version()
+
+    resp = client.get("/dashboard/graph", params=params)
+    assert resp.json()["graph"] == {"Jan": 1000}
+
+
+# /dashboard chart API TESTCASES
+
+def seed_chart_data(db):
+    """
+    Seed May 2023 with a blank and a missing client, lowercase and padded
+    shift types, and clients that tie on head count or allowance.
+
+    Args:
+        db: Database session fixture.
+    """
+    db.query(ShiftAllowances).delete()
+    db.query(ShiftMapping).delete(); db.query(ShiftsAmount).delete(); db.commit()
+    month = date(2023, 5, 1)
+    for emp_id, client_name, shifts in (
+        ("Y1", "ClientB", {"A": 1}),
+        ("Y2", "ClientB", {"B": 1}),
+        ("X1", None, {"a": 2, " b ": 1}),
+        ("X2", "", {"A": 3}),
+        ("Z1", "ClientC", {"PRIME": 1}),
+    ):
+        sa = ShiftAllowances(emp_id=emp_id, emp_name=emp_id, client=client_name,
+                             department="IT", duration_month=month, payroll_month=month)
+        db.add(sa); db.flush()
+        for stype, days in shifts.items():
+            db.add(ShiftMapping(shiftallowance_id=sa.id, shift_type=stype, days=days))
+    for stype, amount in (("A", 100), ("B", 200), ("PRIME", 500)):
+        db.add(ShiftsAmount(shift_type=stype, payroll_year="2023", amount=amount))
+    db.commit()
+
+
+def test_horizontal_bar_unknown_client_and_shift_spelling(client: TestClient, db_session):
+    """
+    Verify blank and missing clients share the "Unknown" bar, shift types
+    are matched case- and space-insensitively, and head-count ties keep
+    the order the clients first appear in.
+    """
+    seed_chart_data(db_session)
+    resp = client.get("/dashboard/horizontal-bar", params={"start_month": "2023-05"})
+    bars = resp.json()["horizontal_bar"]
+
+    assert [b["client_enum"] for b in bars] == ["ClientB", "Unknown", "ClientC"]
+    assert bars[1] == {
+        "client_full_name": "Unknown", "client_enum": "Unknown",
+        "total_unique_employees": 2, "A": 5.0, "B": 1.0, "C": 0.0, "PRIME": 0.0,
+    }
+
+    resp = client.get("/dashboard/horizontal-bar", params={"start_month": "2023-05", "top": 1})
+    assert [b["client_enum"] for b in resp.json()["horizontal_bar"]] == ["ClientB"]
+
+
+def test_piechart_unknown_client_and_allowance_ties(client: TestClient, db_session):
+    """
+    Verify the pie chart's "Unknown" slice, that only an exact-after-upper
+    shift type fills a shift bucket, and that allowance ties keep
+    first-appearance order under top.
+    """
+    seed_chart_data(db_session)
+    resp = client.get("/dashboard/piechart", params={"start_month": "2023-05"})
+    slices = resp.json()
+
+    assert [s["client_enum"] for s in slices] == ["Unknown", "ClientC", "ClientB"]
+    assert slices[0] == {
+        "client_full_name": "Unknown", "client_enum": "Unknown",
+        "total_employees": 2, "shift_a": 5, "shift_b": 0, "shift_c": 0, "prime": 0,
+        "total_days": 5, "total_allowances": 500.0,
+    }
+
+    resp = client.get("/dashboard/piechart", params={"start_month": "2023-05", "top": "1"})
+    assert [s["client_enum"] for s in resp.json()] == ["Unknown"]
+
+
+def test_vertical_bar_unknown_client_and_allowance_ties(client: TestClient, db_session):
+    """
+    Verify the vertical bar's "Unknown" totals, including days of a padded
+    shift type with no rate, and first-appearance order on allowance ties.
+    """
+    seed_chart_data(db_session)
+    resp = client.get("/dashboard/vertical-bar", params={"start_month": "2023-05"})
+    bars = resp.json()
+
+    assert bars == [
+        {"client_full_name": "Unknown", "client_enum": "Unknown",
+         "total_days": 6.0, "total_allowances": 500.0},
+        {"client_full_name": "ClientC", "client_enum": "ClientC",
+         "total_days": 1.0, "total_allowances": 500.0},
+        {"client_full_name": "ClientB", "client_enum": "ClientB",
+         "total_days": 2.0, "total_allowances": 300.0},
+    ]
+
+    resp = client.get("/dashboard/vertical-bar", params={"start_month": "2023-05", "top": "2"})
+    assert [b["client_enum"] for b in resp.json()] == ["Unknown", "ClientC"]
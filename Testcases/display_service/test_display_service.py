@@ -10,7 +10,9 @@ from datetime import date
 from fastapi.testclient import TestClient
 from fastapi import HTTPException
 from main import app
-from models.models import ShiftAllowances, ShiftsAmount
+from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from services.data_version import bump_data_version
+from services.rates_cache import get_rate_rows
 from utils.client_enums import Company
 from utils.dependencies import get_current_user
 client = TestClient(app)
@@ -82,6 +84,153 @@ def test_update_shift_record_not_found(client: TestClient):
     assert "No shift record found" in resp.json()["detail"]
 
 
+def seed_update_record(db, **shift_days):
+    """
+    Seed one Feb 2024 record for IN09000001 with the given shift days.
+
+    Args:
+        db: Database session fixture.
+        shift_days: Shift type -> days for the record's mappings.
+    """
+    old_ids = [r.id for r in db.query(ShiftAllowances.id).filter(ShiftAllowances.emp_id == "IN09000001")]
+    db.query(ShiftMapping).filter(ShiftMapping.shiftallowance_id.in_(old_ids)).delete()
+    db.query(ShiftAllowances).filter(ShiftAllowances.id.in_(old_ids)).delete()
+    allowance = ShiftAllowances(emp_id="IN09000001", emp_name="User2",
+                                duration_month=date(2024,2,1),
+                                payroll_month=date(2024,3,1))
+    db.add(allowance)
+    db.flush()
+    db.add_all([
+        ShiftMapping(shiftallowance_id=allowance.id, shift_type=stype, days=days)
+        for stype, days in shift_days.items()
+    ])
+    db.commit()
+    return allowance.id
+
+
+def stored_days(db, allowance_id):
+    """Return {shift_type: days} as stored for the record."""
+    return {
+        m.shift_type: float(m.days)
+        for m in db.query(ShiftMapping).filter(ShiftMapping.shiftallowance_id == allowance_id)
+    }
+
+
+def test_update_shift_over_month_limit_not_persisted(client: TestClient, db_session):
+    """
+    Verify an update that pushes the record past the month's days
+    is rejected and leaves the stored days unchanged.
+    """
+    allowance_id = seed_update_record(db_session, A=20)
+
+    resp = client.put(
+        UPDATE_URL,
+        params={"emp_id":"IN09000001","duration_month":"2024-02","payroll_month":"2024-03"},
+        json={"shift_b":"15"}
+    )
+    assert resp.status_code == 400
+    assert "exceed" in resp.json()["detail"]
+
+    db_session.expire_all()
+    assert stored_days(db_session, allowance_id) == {"A": 20.0}
+
+
+def test_update_shift_adds_new_shift_type(client: TestClient, db_session):
+    """
+    Verify updating a shift the record has no mapping for creates it.
+    """
+    allowance_id = seed_update_record(db_session, A=2)
+
+    resp = client.put(
+        UPDATE_URL,
+        params={"emp_id":"IN09000001","duration_month":"2024-02","payroll_month":"2024-03"},
+        json={"shift_c":"3"}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["total_days"] == 5
+
+    db_session.expire_all()
+    assert stored_days(db_session, allowance_id) == {"A": 2.0, "C": 3.0}
+
+
+def test_update_shift_prices_with_current_rate(client: TestClient, db_session):
+    """
+    Verify a rate edit followed by bump_data_version() reaches the
+    cached rates used to price and store an update.
+    """
+    db_session.query(ShiftsAmount).delete()
+    db_session.add(ShiftsAmount(shift_type="A", amount=100, payroll_year=2024))
+    allowance_id = seed_update_record(db_session, A=1)
+    get_rate_rows(db_session)
+
+    db_session.query(ShiftsAmount).update({ShiftsAmount.amount: 300})
+    db_session.commit()
+    bump_data_version()
+
+    resp = client.put(
+        UPDATE_URL,
+        params={"emp_id":"IN09000001","duration_month":"2024-02","payroll_month":"2024-03"},
+        json={"shift_a":"2"}
+    )
+    assert resp.json()["total_allowance"] == 600
+
+    db_session.expire_all()
+    stored = db_session.query(ShiftMapping).filter(ShiftMapping.shiftallowance_id == allowance_id).one()
+    assert stored.total_allowance == 600
+
+
+# /display/ API TESTCASES
+
+def seed_current_month_records(db, count):
+    """
+    Replace the current month's records with `count` fresh ones.
+
+    Args:
+        db: Database session fixture.
+        count: Number of records to seed.
+    """
+    month = date.today().replace(day=1)
+    old_ids = [r.id for r in db.query(ShiftAllowances.id).filter(ShiftAllowances.duration_month >= month)]
+    db.query(ShiftMapping).filter(ShiftMapping.shiftallowance_id.in_(old_ids)).delete()
+    db.query(ShiftAllowances).filter(ShiftAllowances.id.in_(old_ids)).delete()
+    db.add_all([
+        ShiftAllowances(emp_id=f"PG{i:03d}", emp_name=f"User{i}",
+                        duration_month=month, payroll_month=month)
+        for i in range(count)
+    ])
+    db.commit()
+
+
+def test_display_first_page(client: TestClient, db_session):
+    """
+    Verify the first page returns `limit` rows and the month's total.
+    """
+    seed_current_month_records(db_session, 5)
+    resp = client.get("/display/", params={"start": 0, "limit": 2}).json()
+    assert resp["total_records"] == 5
+    assert [r["emp_id"] for r in resp["data"]] == ["PG000", "PG001"]
+
+
+def test_display_last_partial_page(client: TestClient, db_session):
+    """
+    Verify a last, partial page returns the remaining rows and the total.
+    """
+    seed_current_month_records(db_session, 5)
+    resp = client.get("/display/", params={"start": 4, "limit": 2}).json()
+    assert resp["total_records"] == 5
+    assert [r["emp_id"] for r in resp["data"]] == ["PG004"]
+
+
+def test_display_page_past_the_end(client: TestClient, db_session):
+    """
+    Verify a page past the end returns no rows but still the total.
+    """
+    seed_current_month_records(db_session, 5)
+    resp = client.get("/display/", params={"start": 10, "limit": 2}).json()
+    assert resp["total_records"] == 5
+    assert resp["data"] == []
+
+
 # /display/client-enum API TESTCASES
 
 def test_client_enum_authenticated_returns_all_companies():
@@ -3,7 +3,7 @@ Routes for downloading client summary reports.
 """
 
 from fastapi import APIRouter, Depends, Body
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from db import get_db
 from services.client_summary_download_service import (
@@ -30,12 +30,12 @@ def download_client_summary_excel(
     _current_user=Depends(get_current_user),
 ):
     """Generate and download the client summary Excel report."""
-    file_path = client_summary_download_service(
+    file_stream = client_summary_download_service(
         db=db,payload=payload)
 
-    return FileResponse(
-        path=file_path,
-        filename="client_summary.xlsx",
+    return StreamingResponse(
+        file_stream,
         media_type=("application/vnd.openxmlformats-officedocument."
         "spreadsheetml.sheet"),
+        headers={"Content-Disposition": "attachment; filename=client_summary.xlsx"},
     )
@@ -0,0 +1,31 @@
+-- Query indexes declared on the models in models/models.py.
+--
+-- Base.metadata.create_all() only builds an index together with its
+-- table, so databases created before these indexes were added need this
+-- script. It is safe to re-run. CONCURRENTLY keeps uploads unblocked
+-- while an index builds; run it outside a transaction, e.g.
+--   psql "$DATABASE_URL" -f migrations/001_query_indexes.sql
+-- A failed concurrent build leaves an INVALID index that IF NOT EXISTS
+-- would skip; drop it and re-run.
+
+-- Case-insensitive client filters of the client summary, plus its month range.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sa_client_lc_month
+    ON shift_allowances (lower(client), duration_month);
+
+-- Dashboard month-range scans, optionally narrowed to one client.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sa_month_client
+    ON shift_allowances (duration_month, client);
+
+-- shift_mapping's foreign key: relationship loads and allowance joins.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sm_parent_type
+    ON shift_mapping (shiftallowance_id, shift_type);
+
+-- Per-employee record lookups: shift edits, record fetch and export.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sa_emp_month
+    ON shift_allowances (emp_id, duration_month);
+
+-- Indexes removed from the models as redundant. Drop them where a fresh
+-- create_all() already built them.
+DROP INDEX CONCURRENTLY IF EXISTS ix_sa_client_dept_lc;
+DROP INDEX CONCURRENTLY IF EXISTS ix_shift_amount_year_type;
+DROP INDEX CONCURRENTLY IF EXISTS ix_sa_client;
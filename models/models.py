@@ -8,7 +8,7 @@ shift allowances, shift mappings, and shift amount configurations.
 # pylint: disable=too-few-public-methods,not-callable
 from sqlalchemy import (
     Column, Integer, String, Text, TIMESTAMP, Numeric, func,
-    ForeignKey,UniqueConstraint,Date,CheckConstraint,Float
+    ForeignKey,UniqueConstraint,Date,CheckConstraint,Float,Index
 )
 from sqlalchemy.orm import relationship
 from db import Base
@@ -78,6 +78,15 @@ class ShiftAllowances(Base):
     __table_args__ = (
         UniqueConstraint('duration_month', 'payroll_month', 'emp_id','client',
                          name='uix_payroll_employee'),
+        # Indexes here reach existing databases through
+        # migrations/001_query_indexes.sql, not create_all.
+        # Expression index so the case-insensitive client filters used by
+        # the summary endpoints stay sargable; department is a residual.
+        Index('ix_sa_client_lc_month', func.lower(client), duration_month),
+        # Dashboard month-range scans, including the graph's one-client range.
+        Index('ix_sa_month_client', duration_month, client),
+        # Per-employee record lookups (shift edits, record fetch/export).
+        Index('ix_sa_emp_month', emp_id, duration_month),
     )
 
 
@@ -109,6 +118,8 @@ class ShiftMapping(Base):
     # Optional: ensure days is non-negative
     __table_args__ = (
         CheckConstraint('days >= 0', name='chk_days_non_negative'),
+        # Parent lookups (relationship loads, joins) grouped by shift type.
+        Index('ix_sm_parent_type', shiftallowance_id, shift_type),
     )
 
     shift_allowance = relationship("ShiftAllowances", back_populates="shift_mappings")
@@ -2,24 +2,37 @@
 
 from datetime import datetime, date
 from calendar import monthrange
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from decimal import Decimal
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, select
 from dateutil.relativedelta import relativedelta
-from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from models.models import ShiftAllowances, ShiftMapping
+from services.rates_cache import get_rate_rows, load_shift_amounts
+from utils.months import YM_RE
 
 def parse_yyyy_mm(value: str) -> date:
     try:
-        dt = datetime.strptime(value, "%Y-%m")
-        return date(dt.year, dt.month, 1)
+        match = YM_RE.fullmatch(value)
+        if not match:
+            raise ValueError(value)
+        return date(int(match.group(1)), int(match.group(2)), 1)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid month format '{value}'. Expected 'YYYY-MM'."
         )
 
+DEPT_TOTAL_KEYS = {
+    "A": "dept_total_A",
+    "B": "dept_total_B",
+    "C": "dept_total_C",
+    "PRIME": "dept_total_PRIME",
+}
+
+@lru_cache(maxsize=512)
 def month_key_from_date(d: date) -> str:
     return d.strftime("%Y-%m")
 
@@ -82,8 +95,8 @@ def client_comparison_service(
             detail=f"end_month cannot be greater than current month ({current_month.strftime('%Y-%m')})."
         )
 
-    q = (
-        db.query(
+    stmt = (
+        select(
             ShiftAllowances.emp_id,
             ShiftAllowances.emp_name,
             ShiftAllowances.department,
@@ -93,27 +106,23 @@ def client_comparison_service(
             ShiftAllowances.payroll_month,
             ShiftMapping.shift_type,
             ShiftMapping.days,
-            ShiftsAmount.amount,
         )
         .join(ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id)
-        .join(
-            ShiftsAmount,
-            and_(
-                ShiftsAmount.shift_type == ShiftMapping.shift_type,
-                ShiftsAmount.payroll_year == func.to_char(ShiftAllowances.payroll_month, "YYYY"),
-            ),
-        )
-        .filter(ShiftAllowances.client == client_name)
-        .filter(
+        .where(ShiftAllowances.client == client_name)
+        .where(
             ShiftAllowances.duration_month >= start_date,
             ShiftAllowances.duration_month <= end_date,
         )
     )
 
     if account_manager:
-        q = q.filter(ShiftAllowances.account_manager == account_manager)
+        stmt = stmt.where(ShiftAllowances.account_manager == account_manager)
 
-    rows = q.all()
+    # Plain column tuples: executed as Core so rows skip the ORM loading layer.
+    rows = db.connection().execute(stmt).tuples()
+    # Rates are priced from a (payroll year, shift type) lookup instead of
+    # joining on to_char(payroll_month), which no index can serve.
+    rate_for = load_shift_amounts(db).get
     data: Dict[str, Dict[str, Dict[str, Any]]] = {}
 
     for (
@@ -126,19 +135,24 @@ def client_comparison_service(
         payroll_month,
         shift_type,
         days,
-        amount,
     ) in rows:
-        if duration_month is None:
+        if duration_month is None or payroll_month is None:
+            continue
+        amount = rate_for((str(payroll_month.year), shift_type))
+        if amount is None:
             continue
 
         month_key = month_key_from_date(duration_month)
         dept_key = department or "UNKNOWN"
-        payroll_month_key = payroll_month.strftime("%Y-%m") if payroll_month else None
+        payroll_month_key = month_key_from_date(payroll_month)
 
-        month_bucket = data.setdefault(month_key, {})
-        dept_bucket = month_bucket.setdefault(
-            dept_key,
-            {
+        month_bucket = data.get(month_key)
+        if month_bucket is None:
+            month_bucket = data[month_key] = {}
+
+        dept_bucket = month_bucket.get(dept_key)
+        if dept_bucket is None:
+            dept_bucket = month_bucket[dept_key] = {
                 "total_allowance": 0.0,
                 "dept_total_A": 0.0,
                 "dept_total_B": 0.0,
@@ -147,17 +161,15 @@ def client_comparison_service(
                 "head_count_set": set(),
                 "diff": 0.0,
                 "emp": {},
-            },
-        )
+            }
 
-        days_val = float(days or 0)
-        amount_val = float(amount or 0)
-        shift_allowance = days_val * amount_val
+        shift_allowance = float(days or 0) * float(amount or 0)
 
-        emp_key = f"{emp_id}|{payroll_month_key or ''}"
-        emp_bucket = dept_bucket["emp"].setdefault(
-            emp_key,
-            {
+        emp_key = (emp_id, payroll_month_key)
+        emps = dept_bucket["emp"]
+        emp_bucket = emps.get(emp_key)
+        if emp_bucket is None:
+            emp_bucket = emps[emp_key] = {
                 "emp_id": emp_id,
                 "emp_name": emp_name,
                 "duration_month": month_key,
@@ -168,23 +180,15 @@ def client_comparison_service(
                 "C": 0.0,
                 "PRIME": 0.0,
                 "total_allowance": 0.0,
-            },
-        )
-
-        if shift_type in ("A", "B", "C", "PRIME"):
-            emp_bucket[shift_type] += shift_allowance
+            }
 
         emp_bucket["total_allowance"] += shift_allowance
         dept_bucket["total_allowance"] += shift_allowance
 
-        if shift_type == "A":
-            dept_bucket["dept_total_A"] += shift_allowance
-        elif shift_type == "B":
-            dept_bucket["dept_total_B"] += shift_allowance
-        elif shift_type == "C":
-            dept_bucket["dept_total_C"] += shift_allowance
-        elif shift_type == "PRIME":
-            dept_bucket["dept_total_PRIME"] += shift_allowance
+        dept_total_key = DEPT_TOTAL_KEYS.get(shift_type)
+        if dept_total_key:
+            emp_bucket[shift_type] += shift_allowance
+            dept_bucket[dept_total_key] += shift_allowance
 
         dept_bucket["head_count_set"].add(emp_id)
 
@@ -205,8 +209,8 @@ def client_comparison_service(
         for dept_key, curr_dept_bucket in curr_month_bucket.items():
             if dept_key not in prev_month_bucket:
                 continue
-            prev_total = float(prev_month_bucket[dept_key]["total_allowance"])
-            curr_total = float(curr_dept_bucket["total_allowance"])
+            prev_total = prev_month_bucket[dept_key]["total_allowance"]
+            curr_total = curr_dept_bucket["total_allowance"]
             curr_dept_bucket["diff"] = curr_total - prev_total
 
     for month_key, month_bucket in data.items():
@@ -214,23 +218,23 @@ def client_comparison_service(
         emp_ids_month = set()
 
         for dept_key, dept_bucket in month_bucket.items():
-            total_allowance_month += float(dept_bucket["total_allowance"])
+            total_allowance_month += dept_bucket["total_allowance"]
             for emp in dept_bucket["emp"]:
                 emp_ids_month.add(emp["emp_id"])
 
         month_bucket["vertical_total"] = {
             "total_allowance": total_allowance_month,
-            "total_A": sum(float(month_bucket[d]["dept_total_A"]) for d in month_bucket if d != "vertical_total"),
-            "total_B": sum(float(month_bucket[d]["dept_total_B"]) for d in month_bucket if d != "vertical_total"),
-            "total_C": sum(float(month_bucket[d]["dept_total_C"]) for d in month_bucket if d != "vertical_total"),
-            "total_PRIME": sum(float(month_bucket[d]["dept_total_PRIME"]) for d in month_bucket if d != "vertical_total"),
+            "total_A": sum(month_bucket[d]["dept_total_A"] for d in month_bucket if d != "vertical_total"),
+            "total_B": sum(month_bucket[d]["dept_total_B"] for d in month_bucket if d != "vertical_total"),
+            "total_C": sum(month_bucket[d]["dept_total_C"] for d in month_bucket if d != "vertical_total"),
+            "total_PRIME": sum(month_bucket[d]["dept_total_PRIME"] for d in month_bucket if d != "vertical_total"),
             "head_count": len(emp_ids_month),
         }
 
     sorted_months = sorted(data.keys())
     for idx in range(len(sorted_months)):
         curr_month_key = sorted_months[idx]
-        curr_total = float(data[curr_month_key]["vertical_total"]["total_allowance"])
+        curr_total = data[curr_month_key]["vertical_total"]["total_allowance"]
 
         y, m = map(int, curr_month_key.split("-"))
         prev_y = y if m > 1 else y - 1
@@ -240,7 +244,7 @@ def client_comparison_service(
         if prev_month_seq not in data:
             data[curr_month_key]["vertical_total"]["month_total_diff"] = 0.0
         else:
-            prev_total = float(data[prev_month_seq]["vertical_total"]["total_allowance"])
+            prev_total = data[prev_month_seq]["vertical_total"]["total_allowance"]
             data[curr_month_key]["vertical_total"]["month_total_diff"] = curr_total - prev_total
 
     horizontal_total: Dict[str, Dict[str, Any]] = {}
@@ -253,7 +257,7 @@ def client_comparison_service(
                 dept_key,
                 {"total_allowance": 0.0, "emp_ids": set()},
             )
-            h_bucket["total_allowance"] += float(dept_bucket["total_allowance"])
+            h_bucket["total_allowance"] += dept_bucket["total_allowance"]
             for emp in dept_bucket["emp"]:
                 h_bucket["emp_ids"].add(emp["emp_id"])
 
@@ -360,8 +364,10 @@ def get_client_total_allowances(db: Session, start_month: str | None, end_month:
 
         months = generate_months(start_month, end_month)
 
-    rate_rows = db.query(ShiftsAmount).all()
-    rates = {r.shift_type.upper(): Decimal(r.amount) for r in rate_rows}
+    rates = {
+        shift_type.upper(): Decimal(amount)
+        for _, shift_type, amount in get_rate_rows(db)
+    }
 
     summary = {}
 
@@ -405,12 +411,6 @@ def get_client_departments_service(db: Session, client: str | None):
     if client is not None:
         client = client.strip()
 
-        if not isinstance(client, str):
-            raise HTTPException(
-                status_code=400,
-                detail="Client name must be a string"
-            )
-
         if client == "":
             raise HTTPException(
                 status_code=400,
@@ -431,6 +431,8 @@ def get_client_departments_service(db: Session, client: str | None):
                 ShiftAllowances.client == client,
                 ShiftAllowances.client.isnot(None)
             )
+            .distinct()
+            .order_by(ShiftAllowances.department)
             .all()
         )
 
@@ -440,7 +442,7 @@ def get_client_departments_service(db: Session, client: str | None):
                 detail=f"Client '{client}' not found"
             )
 
-        departments = sorted({r[0] for r in rows if r[0]})
+        departments = [r[0] for r in rows if r[0]]
 
         return [{
             "client": client,
@@ -454,6 +456,8 @@ def get_client_departments_service(db: Session, client: str | None):
             ShiftAllowances.department
         )
         .filter(ShiftAllowances.client.isnot(None))
+        .distinct()
+        .order_by(ShiftAllowances.client, ShiftAllowances.department)
         .all()
     )
 
@@ -464,15 +468,15 @@ def get_client_departments_service(db: Session, client: str | None):
         if not client_name:
             continue
 
-        result.setdefault(client_name, set())
+        depts = result.setdefault(client_name, [])
 
         if dept:
-            result[client_name].add(dept)
+            depts.append(dept)
 
     return [
         {
             "client": c,
-            "departments": sorted(list(depts))
+            "departments": depts
         }
         for c, depts in result.items()
     ]
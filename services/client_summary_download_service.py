@@ -1,110 +1,134 @@
 """Service for exporting client summary data as an Excel file."""
 
-import os
-from datetime import date
+from io import BytesIO
 from typing import List, Dict
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
-import pandas as pd
-from services.client_summary_service import client_summary_service
-from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from openpyxl import Workbook
+from services.client_summary_service import (
+    resolve_filters, resolve_display_names, period_keys, period_key_for,
+    fetch_rows)
+from services.rates_cache import load_shift_amounts
 
 
-# ---------------- HELPERS ----------------
+EXPORT_COLUMNS = [
+    "Period", "Client", "Department", "Head Count",
+    "Shift A", "Shift B", "Shift C", "Shift PRIME", "Total Allowance",
+]
 
-def validate_year(year: int):
-    """Validate that the selected year is not invalid or in the future."""
-    current_year = date.today().year
-    if year <= 0:
-        raise HTTPException(400, "selected_year must be greater than 0")
-    if year > current_year:
-        raise HTTPException(400, "selected_year cannot be in the future")
 
+# ---------------- EXPORT ROWS ----------------
 
-def quarter_to_months(q: str) -> List[int]:
-    """Convert quarter string (Q1–Q4) into a list of month numbers."""
-    mapping = {
-        "Q1": [1, 2, 3],
-        "Q2": [4, 5, 6],
-        "Q3": [7, 8, 9],
-        "Q4": [10, 11, 12],
-    }
-    q = q.upper().strip()
-    if q not in mapping:
-        raise HTTPException(400, "Invalid quarter (Q1–Q4 expected)")
-    return mapping[q]
-
-
-def month_range(start: str, end: str) -> Dict[int, List[int]]:
-    """Generate a year-to-months mapping between two YYYY-MM values."""
-    sy, sm = map(int, start.split("-"))
-    ey, em = map(int, end.split("-"))
-
-    if (sy, sm) > (ey, em):
-        raise HTTPException(400, "start_month cannot be greater than end_month")
-
-    months = []
-    y, m = sy, sm
-    while (y, m) <= (ey, em):
-        months.append((y, m))
-        m += 1
-        if m > 12:
-            m = 1
-            y += 1
-
-    result = {}
-    for y, m in months:
-        result.setdefault(y, []).append(m)
-
-    return result
+def client_summary_rows(db: Session, payload: dict) -> List[Dict]:
+    """
+    Build the department-level export rows straight from the aggregated
+    summary query, without materializing the nested employee-level
+    summary first. Requested departments with no data are kept as zero rows.
+    """
+    filters = resolve_filters(db, payload or {})
+    month_to_quarter = filters["month_to_quarter"]
+    client_name_map = filters["client_name_map"]
+    dept_name_map = filters["dept_name_map"]
+
+    def new_row(period_key, client_name, dept_name):
+        return {
+            "Period": period_key,
+            "Client": client_name,
+            "Department": dept_name,
+            "Head Count": 0,
+            "Shift A": 0,
+            "Shift B": 0,
+            "Shift C": 0,
+            "Shift PRIME": 0,
+            "Total Allowance": 0,
+        }
+
+    # period -> client -> department -> export row
+    periods: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+    for period_key in period_keys(filters):
+        clients = periods[period_key] = {}
+        for client_lc, depts_lc in filters["normalized_clients"].items():
+            client_name = client_name_map[client_lc]
+            depts = clients.setdefault(client_name, {})
+            for dept_lc in depts_lc:
+                dept_name = dept_name_map[(client_lc, dept_lc)]
+                if dept_name not in depts:
+                    depts[dept_name] = new_row(period_key, client_name, dept_name)
+
+    amount_by_year_type = load_shift_amounts(db)
+    head_sets: Dict[tuple, set] = {}
+    display_names: Dict[tuple, tuple] = {}
+
+    for row in fetch_rows(db, filters):
+        dm = row.duration_month
+        period_key = period_key_for(dm, month_to_quarter)
+        names = display_names.get((row.client, row.department))
+        if names is None:
+            names = display_names[(row.client, row.department)] = resolve_display_names(
+                filters, row.client, row.department)
+        client_name, dept_name = names
+
+        clients = periods[period_key]
+        depts = clients.get(client_name)
+        if depts is None:
+            depts = clients[client_name] = {}
+        out = depts.get(dept_name)
+        if out is None:
+            out = depts[dept_name] = new_row(period_key, client_name, dept_name)
+
+        head_key = (period_key, client_name, dept_name)
+        emps = head_sets.get(head_key)
+        if emps is None:
+            emps = head_sets[head_key] = set()
+        if row.emp_id not in emps:
+            emps.add(row.emp_id)
+            out["Head Count"] += 1
+
+        # As in the summary, shift types without a column of their own
+        # still count towards the total.
+        total = row.days * amount_by_year_type.get((str(dm.year), row.shift_type), 0)
+        shift_col = f"Shift {row.shift_type}"
+        if shift_col in out:
+            out[shift_col] += total
+        out["Total Allowance"] += total
+
+    return [
+        out
+        for clients in periods.values()
+        for depts in clients.values()
+        for out in depts.values()
+    ]
+
+
+# ---------------- EXCEL RENDER ----------------
+
+def _render_excel(rows: List[Dict]) -> bytes:
+    """Encode the export rows as a single-sheet Excel workbook."""
+    # Write-only mode streams rows out instead of holding a Cell object
+    # per value in memory.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Client Summary")
+    ws.append(EXPORT_COLUMNS)
+    for row in rows:
+        ws.append([row[col] for col in EXPORT_COLUMNS])
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
 
 
 # ---------------- MAIN SERVICE ----------------
 
-def client_summary_download_service(db: Session, payload: dict) -> str:
+def client_summary_download_service(db: Session, payload: dict) -> BytesIO:
     """
-    Generate and export client summary Excel.
+    Generate the client summary Excel in memory.
     Export is DEPARTMENT-level (not employee-level)
     so zero departments are preserved.
     """
 
-    # ✅ Use existing summary logic (includes zero-prefill)
-    summary_data = client_summary_service(db, payload)
-
-    if not summary_data:
-        raise HTTPException(404, "No data available")
-
-    rows = []
-
-    for period_key, period_data in summary_data.items():
-        if "clients" not in period_data:
-            continue
-
-        for client_name, client_block in period_data["clients"].items():
-            for dept_name, dept_block in client_block["departments"].items():
-
-                rows.append({
-                    "Period": period_key,
-                    "Client": client_name,
-                    "Department": dept_name,
-                    "Head Count": dept_block.get("dept_head_count", 0),
-                    "Shift A": dept_block.get("dept_A", 0),
-                    "Shift B": dept_block.get("dept_B", 0),
-                    "Shift C": dept_block.get("dept_C", 0),
-                    "Shift PRIME": dept_block.get("dept_PRIME", 0),
-                    "Total Allowance": dept_block.get("dept_total", 0),
-                })
+    rows = client_summary_rows(db, payload)
 
     if not rows:
         raise HTTPException(404, "No data available for export")
 
-    df = pd.DataFrame(rows)
-
-    os.makedirs("exports", exist_ok=True)
-    file_path = "exports/client_summary.xlsx"
-
-    with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Client Summary")
-
-    return file_path
+    return BytesIO(_render_excel(rows))
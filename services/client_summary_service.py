@@ -1,22 +1,38 @@
 """Client summary service for month, quarter, and range based analytics."""
 
-from datetime import date, datetime
-from typing import List, Dict
+import hashlib
+import json
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+from itertools import product
+from typing import List, Dict, Tuple
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, cast, Integer
+from sqlalchemy import Float, and_, cast, func, or_, select
 
-from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from models.models import ShiftAllowances, ShiftMapping
+from services.data_version import current_data_version
+from services.rates_cache import load_shift_amounts
+from utils.months import YM_RE
 
 # ================= CACHE IMPORTS =================
 from diskcache import Cache
 
 cache = Cache("./diskcache/latest_month")
 LATEST_MONTH_KEY = "client_summary:latest_month"
+SUMMARY_KEY_PREFIX = "client_summary:payload:"
 CACHE_TTL = 24 * 60 * 60  # 1 day
+# Bump whenever the response shape changes so entries written by an older
+# deploy are ignored instead of served.
+SUMMARY_SCHEMA_VERSION = 1
 # ===============================================
 
 
+SHIFT_TYPES = ("A", "B", "C", "PRIME")
+ROW_BATCH_SIZE = 10_000
+
+
 # ---------------- HELPERS ----------------
 
 def is_default_latest_month_request(payload: dict) -> bool:
@@ -42,18 +58,28 @@ def validate_year(year: int):
 
 
 def parse_yyyy_mm(value: str) -> date:
-    try:
-        return datetime.strptime(value, "%Y-%m").date().replace(day=1)
-    except Exception:
-        raise HTTPException(400, "Invalid month format. Expected YYYY-MM")
+    match = YM_RE.fullmatch(value) if isinstance(value, str) else None
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), 1)
+        except ValueError:
+            pass
+    raise HTTPException(400, "Invalid month format. Expected YYYY-MM")
 
 
-def quarter_to_months(q: str) -> List[int]:
-    mapping = {"Q1": [1,2,3], "Q2": [4,5,6], "Q3": [7,8,9], "Q4": [10,11,12]}
-    q = q.upper().strip()
-    if q not in mapping:
-        raise HTTPException(400, "Invalid quarter (expected Q1–Q4)")
-    return mapping[q]
+_QUARTER_MONTHS = {
+    "Q1": (1, 2, 3),
+    "Q2": (4, 5, 6),
+    "Q3": (7, 8, 9),
+    "Q4": (10, 11, 12),
+}
+
+
+def quarter_to_months(q: str) -> Tuple[int, ...]:
+    try:
+        return _QUARTER_MONTHS[q.upper().strip()]
+    except KeyError:
+        raise HTTPException(400, "Invalid quarter (expected Q1–Q4)") from None
 
 
 def month_range(start: date, end: date) -> List[date]:
@@ -69,22 +95,91 @@ def month_range(start: date, end: date) -> List[date]:
     return months
 
 
+def is_contiguous_months(months: List[date]) -> bool:
+    """True when the sorted, first-of-month dates step by exactly one month."""
+    for prev, cur in zip(months, months[1:]):
+        if (cur.year * 12 + cur.month) - (prev.year * 12 + prev.month) != 1:
+            return False
+    return True
+
+
+def summary_cache_key(payload: dict, data_version: int, rates: Dict[tuple, float]) -> str:
+    """
+    Cache key for a summary payload. The data version moves on every
+    upload, correction or shift edit; the rates are part of the key so an
+    edited rate is never served from an entry priced with the old one.
+    """
+    raw = json.dumps(
+        {
+            "p": payload,
+            "d": data_version,
+            "r": sorted(rates.items()),
+            "v": SUMMARY_SCHEMA_VERSION,
+        },
+        sort_keys=True, default=str,
+    )
+    return SUMMARY_KEY_PREFIX + hashlib.blake2b(raw.encode()).hexdigest()
+
+
+# Zeroed block templates. The factories below copy these instead of
+# re-evaluating the literals; mutable members are None placeholders so
+# key order is kept and each copy gets its own list/dict.
+_EMPTY_SHIFT = {"A": 0, "B": 0, "C": 0, "PRIME": 0}
+
+_EMPTY_MONTH_TOTAL = {
+    "total_head_count": 0,
+    **_EMPTY_SHIFT,
+    "total_allowance": 0,
+}
+
+_EMPTY_CLIENT = {
+    "client_A": 0, "client_B": 0, "client_C": 0, "client_PRIME": 0,
+    "departments": None,
+    "client_head_count": 0,
+    "client_total": 0,
+}
+
+_EMPTY_DEPT = {
+    "dept_A": 0, "dept_B": 0, "dept_C": 0, "dept_PRIME": 0,
+    "dept_total": 0,
+    "employees": None,
+    "dept_head_count": 0,
+}
+
+_EMPTY_EMP = {
+    "emp_id": None,
+    "emp_name": None,
+    "account_manager": None,
+    **_EMPTY_SHIFT,
+    "total": 0,
+}
+
+
 def empty_shift_totals():
-    return {"A": 0, "B": 0, "C": 0, "PRIME": 0}
+    return _EMPTY_SHIFT.copy()
 
 
-# ---------------- MAIN SERVICE ----------------
+def _new_month_block():
+    return {"clients": {}, "month_total": _EMPTY_MONTH_TOTAL.copy()}
 
-def client_summary_service(db: Session, payload: dict):
-    payload = payload or {}
- 
-    # ---------- CACHE READ (LATEST MONTH ONLY) ----------
-    if is_default_latest_month_request(payload):
-        cached = cache.get(LATEST_MONTH_KEY)
-        if cached:
-            return cached["data"]
-    # ---------------------------------------------------
- 
+
+def _new_client_block():
+    return dict(_EMPTY_CLIENT, departments={})
+
+
+def _new_dept_block():
+    return dict(_EMPTY_DEPT, employees=[])
+
+
+def _new_emp_block(emp_id, emp_name, acc_mgr):
+    return dict(_EMPTY_EMP, emp_id=emp_id, emp_name=emp_name, account_manager=acc_mgr)
+
+
+def resolve_filters(db: Session, payload: dict) -> Dict:
+    """
+    Validate the summary payload and resolve it into the months / quarters
+    to report on plus the normalized client -> departments selection.
+    """
     selected_year = payload.get("selected_year")
     selected_months = payload.get("selected_months", [])
     selected_quarters = payload.get("selected_quarters", [])
@@ -156,170 +251,266 @@ def client_summary_service(db: Session, payload: dict):
     elif not months:
         raise HTTPException(400, "No valid date filter provided")
  
-    # ---------------- RESPONSE SKELETON ----------------
-    response: Dict = {}
-    if selected_quarters:
-        for q in quarter_map:
-            response[q] = {"message": f"No data found for {q}"}
-    else:
-        for m in months:
-            response[m.strftime("%Y-%m")] = {"message": f"No data found for {m:%Y-%m}"}
- 
-    # ---------------- ZERO CLIENT / DEPT PRE-CREATION ----------------
-    if isinstance(clients_payload, dict):
-        for period_key in response.keys():
- 
-            if "message" in response[period_key]:
-                response[period_key] = {
-                    "clients": {},
-                    "month_total": {
-                        "total_head_count": 0,
-                        **empty_shift_totals(),
-                        "total_allowance": 0,
-                    },
-                }
- 
-            for client_lc, depts_lc in normalized_clients.items():
-                client_name = client_name_map[client_lc]
- 
-                client_block = response[period_key]["clients"].setdefault(client_name, {
-                    **{f"client_{k}": 0 for k in ["A", "B", "C", "PRIME"]},
-                    "departments": {},
-                    "client_head_count": 0,
-                    "client_total": 0,
-                })
- 
-                for dept_lc in (depts_lc or []):
-                    dept_name = dept_name_map[(client_lc, dept_lc)]
- 
-                    client_block["departments"].setdefault(dept_name, {
-                        **{f"dept_{k}": 0 for k in ["A", "B", "C", "PRIME"]},
-                        "dept_total": 0,
-                        "employees": [],
-                        "dept_head_count": 0,
-                    })
- 
-    # ---------------- DB QUERY ----------------
-    query = (
-        db.query(
-            ShiftAllowances.duration_month,
-            ShiftAllowances.client,
-            ShiftAllowances.department,
-            ShiftAllowances.emp_id,
-            ShiftAllowances.emp_name,
-            ShiftAllowances.account_manager,
-            ShiftMapping.shift_type,
-            ShiftMapping.days,
-            ShiftsAmount.amount,
+    return {
+        "months": months,
+        "quarter_map": quarter_map,
+        "month_to_quarter": {m: q for q, ml in quarter_map.items() for m in ml},
+        "normalized_clients": normalized_clients,
+        "client_name_map": client_name_map,
+        "dept_name_map": dept_name_map,
+    }
+ 
+ 
+def resolve_display_names(filters: Dict, client: str, dept: str) -> tuple:
+    """
+    Map a raw (client, department) pair to the names used in the response:
+    the payload's spelling when the pair was requested, else the stored one.
+    Row loops cache the result per raw pair so each is lowercased only once.
+    """
+    client_lc = client.lower()
+    return (
+        filters["client_name_map"].get(client_lc, client),
+        filters["dept_name_map"].get((client_lc, dept.lower()), dept),
+    )
+
+
+def period_keys(filters: Dict) -> List[str]:
+    """Response period keys, in order: quarter labels or YYYY-MM months."""
+    if filters["quarter_map"]:
+        return list(filters["quarter_map"])
+    return [m.strftime("%Y-%m") for m in filters["months"]]
+ 
+ 
+# Only a few dozen distinct months ever reach the row loops, so these
+# per-row date conversions are memoized.
+@lru_cache(maxsize=512)
+def _ym(dm: date) -> str:
+    return dm.strftime("%Y-%m")
+
+
+@lru_cache(maxsize=512)
+def _first_of_month(dm: date) -> date:
+    return dm.replace(day=1)
+
+
+def period_key_for(dm: date, month_to_quarter: Dict[date, str]) -> str:
+    if month_to_quarter:
+        return month_to_quarter[_first_of_month(dm)]
+    return _ym(dm)
+ 
+ 
+def fetch_rows(db: Session, filters: Dict):
+    """
+    Iterate one row per (month, client, dept, employee, shift type) with
+    the days summed by the database; callers price them via
+    load_shift_amounts().
+    """
+    group_cols = (
+        ShiftAllowances.duration_month,
+        ShiftAllowances.client,
+        ShiftAllowances.department,
+        ShiftAllowances.emp_id,
+        ShiftAllowances.emp_name,
+        ShiftAllowances.account_manager,
+        ShiftMapping.shift_type,
+    )
+    stmt = (
+        select(
+            *group_cols,
+            # days is Numeric; cast the group sum so rows carry plain floats
+            # and skip a Decimal -> float conversion each.
+            cast(func.sum(ShiftMapping.days), Float).label("days"),
         )
         .join(ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id)
-        .outerjoin(
-            ShiftsAmount,
-            and_(
-                ShiftMapping.shift_type == ShiftsAmount.shift_type,
-                cast(ShiftsAmount.payroll_year, Integer)
-                == func.extract("year", ShiftAllowances.duration_month),
-            ),
-        )
     )
  
+    normalized_clients = filters["normalized_clients"]
     if normalized_clients:
-        filters = []
+        # Clients selected without departments collapse into one IN list;
+        # only department-scoped clients need their own AND branch.
+        client_filters = []
+        whole_clients = []
         for client_lc, depts_lc in normalized_clients.items():
             if depts_lc:
-                filters.append(and_(
+                client_filters.append(and_(
                     func.lower(ShiftAllowances.client) == client_lc,
                     func.lower(ShiftAllowances.department).in_(depts_lc),
                 ))
             else:
-                filters.append(func.lower(ShiftAllowances.client) == client_lc)
-        query = query.filter(or_(*filters))
+                whole_clients.append(client_lc)
+        if whole_clients:
+            client_filters.append(func.lower(ShiftAllowances.client).in_(whole_clients))
+        stmt = stmt.where(or_(*client_filters))
  
+    quarter_map = filters["quarter_map"]
     date_list = (
         [m for ml in quarter_map.values() for m in ml]
-        if selected_quarters else months
+        if quarter_map else filters["months"]
     )
  
-    query = query.filter(or_(*[
-        and_(
-            func.extract("year", ShiftAllowances.duration_month) == m.year,
-            func.extract("month", ShiftAllowances.duration_month) == m.month,
+    # duration_month is stored as the first of the month, so plain range /
+    # IN predicates match and stay index-friendly (no per-row extract()).
+    date_list = sorted(set(date_list))
+    if is_contiguous_months(date_list):
+        stmt = stmt.where(
+            ShiftAllowances.duration_month.between(date_list[0], date_list[-1])
         )
-        for m in date_list
-    ]))
+    else:
+        stmt = stmt.where(ShiftAllowances.duration_month.in_(date_list))
+ 
+    # Plain column rows need nothing from the ORM, so the statement runs
+    # as Core on the session's connection, streamed in bounded batches
+    # through a server-side cursor rather than materialized with .all().
+    # Groups come back in the order their records were stored,
+    # so clients, departments and employees keep a stable order.
+    return db.connection().execute(
+        stmt.group_by(*group_cols)
+        .order_by(func.min(ShiftAllowances.id), func.min(ShiftMapping.id))
+        .execution_options(yield_per=ROW_BATCH_SIZE)
+    )
  
-    rows = query.all()
  
-    # ---------------- POPULATE RESPONSE ----------------
-    for dm, client, dept, emp_id, emp_name, acc_mgr, stype, days, amt in rows:
-        period_key = (
-            next(q for q, ml in quarter_map.items() if dm.replace(day=1) in ml)
-            if selected_quarters else dm.strftime("%Y-%m")
-        )
+# ---------------- MAIN SERVICE ----------------
  
-        if "message" in response.get(period_key, {}):
-            response[period_key] = {
-                "clients": {},
-                "month_total": {
-                    "total_head_count": 0,
-                    **empty_shift_totals(),
-                    "total_allowance": 0,
-                },
-            }
+def client_summary_service(db: Session, payload: dict):
+    payload = payload or {}
  
-        client_name = client_name_map.get(client.lower(), client)
-        dept_name = dept_name_map.get((client.lower(), dept.lower()), dept)
+    # ---------- CACHE READ (LATEST MONTH ONLY) ----------
+    if is_default_latest_month_request(payload):
+        cached = cache.get(LATEST_MONTH_KEY)
+        if cached and cached.get("_schema") == SUMMARY_SCHEMA_VERSION:
+            return cached["data"]
  
-        total = float(days or 0) * float(amt or 0)
-        month_block = response[period_key]
+    # ---------- CACHE READ (ANY PAYLOAD, DATA VERSIONED) ----------
+    rates = load_shift_amounts(db)
+    summary_key = summary_cache_key(payload, current_data_version(), rates)
+    cached = cache.get(summary_key)
+    if cached is not None:
+        return cached
+    # ---------------------------------------------------
+ 
+    filters = resolve_filters(db, payload)
+    month_to_quarter = filters["month_to_quarter"]
+    normalized_clients = filters["normalized_clients"]
+    client_name_map = filters["client_name_map"]
+    dept_name_map = filters["dept_name_map"]
  
-        client_block = month_block["clients"].setdefault(client_name, {
-            **{f"client_{k}": 0 for k in ["A", "B", "C", "PRIME"]},
-            "departments": {},
-            "client_head_count": 0,
-            "client_total": 0,
-        })
- 
-        dept_block = client_block["departments"].setdefault(dept_name, {
-            **{f"dept_{k}": 0 for k in ["A", "B", "C", "PRIME"]},
-            "dept_total": 0,
-            "employees": [],
-            "dept_head_count": 0,
-        })
- 
-        emp = next((e for e in dept_block["employees"] if e["emp_id"] == emp_id), None)
-        if not emp:
-            emp = {
-                "emp_id": emp_id,
-                "emp_name": emp_name,
-                "account_manager": acc_mgr,
-                **empty_shift_totals(),
-                "total": 0,
-            }
-            dept_block["employees"].append(emp)
-            dept_block["dept_head_count"] += 1
-            client_block["client_head_count"] += 1
-            month_block["month_total"]["total_head_count"] += 1
- 
-        emp[stype] += total
-        emp["total"] += total
-        dept_block[f"dept_{stype}"] += total
-        dept_block["dept_total"] += total
-        client_block[f"client_{stype}"] += total
-        client_block["client_total"] += total
-        month_block["month_total"][stype] += total
-        month_block["month_total"]["total_allowance"] += total
+    # ---------------- RESPONSE SKELETON ----------------
+    response: Dict = {
+        key: {"message": f"No data found for {key}"}
+        for key in period_keys(filters)
+    }
+ 
+    # ---------------- ZERO CLIENT / DEPT PRE-CREATION ----------------
+    # Every (period, requested client) block is built up front in one pass,
+    # so requested departments with no data still show up as zeros.
+    if normalized_clients:
+        requested = [
+            (
+                client_name_map[client_lc],
+                [dept_name_map[(client_lc, dept_lc)] for dept_lc in depts_lc],
+            )
+            for client_lc, depts_lc in normalized_clients.items()
+        ]
+        for period_key in response:
+            response[period_key] = _new_month_block()
+ 
+        for period_key, (client_name, dept_names) in product(response, requested):
+            clients = response[period_key]["clients"]
+            client_block = clients.get(client_name)
+            if client_block is None:
+                client_block = clients[client_name] = _new_client_block()
+ 
+            departments = client_block["departments"]
+            for dept_name in dept_names:
+                if dept_name not in departments:
+                    departments[dept_name] = _new_dept_block()
+ 
+    rate_for = rates.get
+    rows = fetch_rows(db, filters)
+ 
+    # ---------------- ACCUMULATE ----------------
+    # Per-row work is a flat accumulation keyed by
+    # (period, client, dept, emp_id, shift type); the nested response is
+    # only assembled afterwards, once per employee.
+    emp_info: Dict[tuple, tuple] = {}
+    emp_totals = defaultdict(float)
+    display_names: Dict[tuple, tuple] = {}
+    for dm, client, dept, emp_id, emp_name, acc_mgr, stype, days in rows:
+        period_key = period_key_for(dm, month_to_quarter)
+ 
+        names = display_names.get((client, dept))
+        if names is None:
+            names = display_names[(client, dept)] = resolve_display_names(filters, client, dept)
+        client_name, dept_name = names
+ 
+        emp_key = (period_key, client_name, dept_name, emp_id)
+        if emp_key not in emp_info:
+            emp_info[emp_key] = (emp_name, acc_mgr)
+ 
+        total = days * rate_for((str(dm.year), stype), 0)
+        emp_totals[(*emp_key, stype)] += total
+        emp_totals[(*emp_key, None)] += total
+ 
+    # ---------------- POPULATE RESPONSE ----------------
+    for emp_key, (emp_name, acc_mgr) in emp_info.items():
+        period_key, client_name, dept_name, emp_id = emp_key
+ 
+        month_block = response[period_key]
+        if "message" in month_block:
+            month_block = response[period_key] = _new_month_block()
+ 
+        client_block = month_block["clients"].get(client_name)
+        if client_block is None:
+            client_block = month_block["clients"][client_name] = _new_client_block()
+ 
+        dept_block = client_block["departments"].get(dept_name)
+        if dept_block is None:
+            dept_block = client_block["departments"][dept_name] = _new_dept_block()
+ 
+        emp = _new_emp_block(emp_id, emp_name, acc_mgr)
+        for k in SHIFT_TYPES:
+            emp[k] = emp_totals.get((*emp_key, k), 0)
+        emp["total"] = emp_totals[(*emp_key, None)]
+ 
+        dept_block["employees"].append(emp)
+        dept_block["dept_head_count"] += 1
+        client_block["client_head_count"] += 1
+        month_block["month_total"]["total_head_count"] += 1
+ 
+    # ---------------- ROLL UP TOTALS ----------------
+    # Department, client and month totals are summed once per block here.
+    for month_block in response.values():
+        if "clients" not in month_block:
+            continue
+        month_total = month_block["month_total"]
+        for client_block in month_block["clients"].values():
+            depts = client_block["departments"].values()
+            for dept_block in depts:
+                employees = dept_block["employees"]
+                for k in SHIFT_TYPES:
+                    dept_block[f"dept_{k}"] = sum(e[k] for e in employees)
+                dept_block["dept_total"] = sum(e["total"] for e in employees)
+            for k in SHIFT_TYPES:
+                client_block[f"client_{k}"] = sum(d[f"dept_{k}"] for d in depts)
+            client_block["client_total"] = sum(d["dept_total"] for d in depts)
+        clients = month_block["clients"].values()
+        for k in SHIFT_TYPES:
+            month_total[k] = sum(c[f"client_{k}"] for c in clients)
+        month_total["total_allowance"] = sum(c["client_total"] for c in clients)
  
     # ---------- CACHE WRITE (LATEST MONTH ONLY) ----------
     if is_default_latest_month_request(payload):
         cache.set(
             LATEST_MONTH_KEY,
             {
-                "_cached_month": months[0].strftime("%Y-%m"),
+                "_cached_month": filters["months"][0].strftime("%Y-%m"),
+                "_schema": SUMMARY_SCHEMA_VERSION,
                 "data": response,
             },
             expire=CACHE_TTL,
         )
+    cache.set(summary_key, response, expire=CACHE_TTL)
     # ---------------------------------------------------
  
     return response
@@ -1,23 +1,70 @@
 """Dashboard analytics services for horizontal, vertical, graph, and summary views."""
 
+import hashlib
+import json
+from functools import wraps
 from typing import List
-from decimal import Decimal
 from datetime import datetime,date
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from dateutil.relativedelta import relativedelta
 from sqlalchemy import func,extract,Integer,or_
 from models.models import ShiftAllowances, ShiftsAmount, ShiftMapping
-from utils.client_enums import Company
+from services.data_version import current_data_version
+from services.rates_cache import get_rate_rows
+from utils.client_enums import company_names
+from utils.months import YM_RE
 from schemas.dashboardschema import DashboardFilterRequest
+from diskcache import Cache
+
+response_cache = Cache("./diskcache/dashboard")
+RESPONSE_CACHE_TTL = 5 * 60
+ROW_BATCH_SIZE = 10_000
+
+
+def _parse_ym(value: str):
+    """Return (year, month) for a YYYY-MM string, or None if it is not one."""
+    match = YM_RE.fullmatch(value)
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return year, month
+
+
+def _month_steps(start_m: str, end_m: str):
+    """Yield (year, month) from start_m through end_m, both YYYY-MM."""
+    year, month = _parse_ym(start_m)
+    end = _parse_ym(end_m)
+    while (year, month) <= end:
+        yield year, month
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+
+
+def _add_months(month_start: date, months: int) -> date:
+    """First of the month `months` away from month_start (may be negative)."""
+    year, month = divmod(month_start.year * 12 + month_start.month - 1 + months, 12)
+    return date(year, month + 1, 1)
+
+
+def _validate_ym(value: str) -> bool:
+    """True when value is a YYYY-MM month."""
+    return _parse_ym(value) is not None
+
+
+def _generate_months(start_m: str, end_m: str) -> List[str]:
+    """YYYY-MM strings from start_m through end_m inclusive."""
+    return [f"{y:04d}-{m:02d}" for y, m in _month_steps(start_m, end_m)]
 
 
 def validate_month_format(month: str):
     """Validate and parse a YYYY-MM month string into a date."""
-    try:
-        return datetime.strptime(month + "-01", "%Y-%m-%d").date()
-    except:
+    parsed = _parse_ym(month)
+    if parsed is None:
         raise HTTPException(status_code=400, detail="Invalid month format. Expected YYYY-MM")
+    return date(parsed[0], parsed[1], 1)
 
 
 def _map_client_names(client_value: str):
@@ -26,12 +73,76 @@ def _map_client_names(client_value: str):
         full_name -> Company.value
         enum_name -> Company.name
     """
-    for c in Company:
-        if c.value == client_value or c.name == client_value:
-            return c.value, c.name
+    return company_names(client_value)
+
+def _client_key():
+    """Client grouping key; blank and missing clients report as "Unknown"."""
+    return func.coalesce(
+        func.nullif(ShiftAllowances.client, ""), "Unknown"
+    ).label("client_key")
+
+
+def _month_span_filters(months: List[str]):
+    """
+    Half-open duration_month range covering a contiguous list of YYYY-MM
+    months, so one indexed range scan replaces a query per month.
+    """
+    first_year, first_month = map(int, months[0].split("-"))
+    last_year, last_month = map(int, months[-1].split("-"))
+    start = date(first_year, first_month, 1)
+    end = _add_months(date(last_year, last_month, 1), 1)
+    return (
+        ShiftAllowances.duration_month >= start,
+        ShiftAllowances.duration_month < end,
+    )
+
+def _latest_data_month(db: Session, lookback: int = 12) -> List[str] | None:
+    """
+    Return the most recent YYYY-MM with data within the last `lookback`
+    months (current month included), as a one-element list, or None.
+    """
+    current = date.today().replace(day=1)
+    latest = (
+        db.query(func.max(ShiftAllowances.duration_month))
+        .filter(
+            ShiftAllowances.duration_month >= _add_months(current, 1 - lookback),
+            ShiftAllowances.duration_month < _add_months(current, 1),
+        )
+        .scalar()
+    )
+    return [latest.strftime("%Y-%m")] if latest else None
 
-    return client_value, client_value
 
+def _cached_response(func_):
+    """
+    Serve repeated chart requests from disk. The key covers the call
+    arguments, today's date (default ranges resolve against it), the data
+    version bumped by every upload or edit, and the rates the chart is
+    priced with, so an entry is never reused after any of them change.
+    """
+    @wraps(func_)
+    def wrapper(db: Session, *args, **kwargs):
+        raw = json.dumps(
+            {
+                "a": args,
+                "k": kwargs,
+                "d": date.today().isoformat(),
+                "v": current_data_version(),
+                "r": get_rate_rows(db),
+            },
+            sort_keys=True, default=str,
+        )
+        key = f"dashboard:{func_.__name__}:" + hashlib.blake2b(raw.encode()).hexdigest()
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        result = func_(db, *args, **kwargs)
+        response_cache.set(key, result, expire=RESPONSE_CACHE_TTL)
+        return result
+    return wrapper
+
+
+@_cached_response
 def get_horizontal_bar_service(db: Session,
                                start_month: str | None,
                                end_month: str | None,
@@ -49,42 +160,43 @@ def get_horizontal_bar_service(db: Session,
         end_date = validate_month_format(end_month)
         if start_date > end_date:
             raise HTTPException(status_code=400, detail="start_month must be <= end_month")
-        records = (
-            db.query(ShiftAllowances)
-            .filter(ShiftAllowances.duration_month >= start_date)
-            .filter(ShiftAllowances.duration_month <= end_date)
-            .all()
+        month_filters = (
+            ShiftAllowances.duration_month >= start_date,
+            ShiftAllowances.duration_month <= end_date,
         )
     else:
-        records = (
-            db.query(ShiftAllowances)
-            .filter(ShiftAllowances.duration_month == start_date)
-            .all()
-        )
+        month_filters = (ShiftAllowances.duration_month == start_date,)
+
+    # Both reductions run in the database: distinct employees per client,
+    # and days per (client, shift type). Clients are listed in order of
+    # first appearance so ties keep a stable order after the sort below.
+    client_key = _client_key()
+    head_rows = (
+        db.query(client_key, func.count(func.distinct(ShiftAllowances.emp_id)))
+        .filter(*month_filters)
+        .group_by(client_key)
+        .order_by(func.min(ShiftAllowances.id))
+        .all()
+    )
 
-    if not records:
+    if not head_rows:
         raise HTTPException(status_code=404, detail="No records found in the given month range")
 
-    output = {}
-    for row in records:
-        client = row.client or "Unknown"
-        if client not in output:
-            output[client] = {
-                "total_unique_employees": set(),
-                "A": Decimal(0),
-                "B": Decimal(0),
-                "C": Decimal(0),
-                "PRIME": Decimal(0)
-            }
-        output[client]["total_unique_employees"].add(row.emp_id)
-        for mapping in row.shift_mappings:
-            stype = mapping.shift_type.strip().upper()
-            if stype in ("A", "B", "C", "PRIME"):
-                output[client][stype] += Decimal(mapping.days or 0)
+    shift_type = func.upper(func.trim(ShiftMapping.shift_type))
+    day_rows = (
+        db.query(client_key, shift_type, func.sum(ShiftMapping.days))
+        .join(ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id)
+        .filter(*month_filters, shift_type.in_(SHIFT_TYPES))
+        .group_by(client_key, shift_type)
+        .all()
+    )
+    days_by_client = {}
+    for client, stype, days in day_rows:
+        days_by_client.setdefault(client, {})[stype] = float(days or 0)
 
     result = []
-    for client, info in output.items():
-        total = len(info["total_unique_employees"])
+    for client, total in head_rows:
+        days = days_by_client.get(client, {})
 
         client_full, client_enum = _map_client_names(client)
 
@@ -92,10 +204,10 @@ def get_horizontal_bar_service(db: Session,
             "client_full_name": client_full,
             "client_enum": client_enum,
             "total_unique_employees": total,
-            "A": float(info["A"]),
-            "B": float(info["B"]),
-            "C": float(info["C"]),
-            "PRIME": float(info["PRIME"]),
+            "A": days.get("A", 0.0),
+            "B": days.get("B", 0.0),
+            "C": days.get("C", 0.0),
+            "PRIME": days.get("PRIME", 0.0),
         })
 
     result.sort(key=lambda x: x["total_unique_employees"], reverse=True)
@@ -108,6 +220,7 @@ def get_horizontal_bar_service(db: Session,
     return {"horizontal_bar": result}
 
 
+@_cached_response
 def get_graph_service(
     db: Session,
     client_name: str,
@@ -124,33 +237,17 @@ def get_graph_service(
             detail="Client name must contain letters only (no numbers allowed)"
         )
 
-    client_exists = (
-        db.query(ShiftAllowances)
+    client_exists = db.query(
+        db.query(ShiftAllowances.id)
         .filter(ShiftAllowances.client == client_name)
-        .first()
-    )
+        .exists()
+    ).scalar()
     if not client_exists:
         raise HTTPException(
             status_code=404,
             detail=f"Client '{client_name}' not found in database"
         )
 
-    def validate_month(m: str):
-        try:
-            datetime.strptime(m, "%Y-%m")
-            return True
-        except:
-            return False
-
-    def generate_months(start_m: str, end_m: str):
-        result = []
-        cur = datetime.strptime(start_m, "%Y-%m")
-        end = datetime.strptime(end_m, "%Y-%m")
-        while cur <= end:
-            result.append(cur)
-            cur += relativedelta(months=1)
-        return result
-
     if end_month and not start_month:
         raise HTTPException(
             status_code=400,
@@ -161,59 +258,61 @@ def get_graph_service(
         current_year = datetime.now().year
         months = [datetime(current_year, m, 1) for m in range(1, 13)]
     else:
-        if not validate_month(start_month):
+        if not _validate_ym(start_month):
             raise HTTPException(status_code=400, detail="start_month must be YYYY-MM format")
 
-        if end_month and not validate_month(end_month):
+        if end_month and not _validate_ym(end_month):
             raise HTTPException(status_code=400, detail="end_month must be YYYY-MM format")
 
         if end_month and end_month < start_month:
             raise HTTPException(status_code=400, detail="end_month must be >= start_month")
 
         if not end_month:
-            months = [datetime.strptime(start_month, "%Y-%m")]
+            months = [datetime(*_parse_ym(start_month), 1)]
         else:
-            months = generate_months(start_month, end_month)
-
-    years = {m.year for m in months}
-    rate_map = {}
-
-    for yr in years:
-        rows = db.query(ShiftsAmount).filter(
-            ShiftsAmount.payroll_year == str(yr)
-        ).all()
-        rate_map[yr] = {
-            r.shift_type.strip().upper(): Decimal(str(r.amount)) for r in rows
-        }
+            months = [
+                datetime(y, m, 1) for y, m in _month_steps(start_month, end_month)
+            ]
+
+    years = {str(m.year): m.year for m in months}
+    rate_map = {yr: {} for yr in years.values()}
+
+    for payroll_year, shift_type, amount in get_rate_rows(db):
+        if payroll_year in years:
+            rate_map[years[payroll_year]][shift_type.strip().upper()] = float(amount)
+
+    # One grouped query for the whole span: days per (month, shift type),
+    # priced with that year's rates below. That is only a few float
+    # products per month, so one round() at the end keeps cents exact.
+    span_start = date(months[0].year, months[0].month, 1)
+    day_rows = db.query(
+        ShiftAllowances.duration_month,
+        ShiftMapping.shift_type,
+        func.sum(ShiftMapping.days),
+    ).join(
+        ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id
+    ).filter(
+        ShiftAllowances.client == client_name,
+        ShiftAllowances.duration_month >= span_start,
+        ShiftAllowances.duration_month
+        < _add_months(date(months[-1].year, months[-1].month, 1), 1),
+    ).group_by(
+        ShiftAllowances.duration_month, ShiftMapping.shift_type
+    ).all()
+
+    totals_by_month = {}
+    for duration_month, raw, days in day_rows:
+        key = (duration_month.year, duration_month.month)
+        stype = _STYPE_NORM.get(raw) or raw.strip().upper()
+        rate = rate_map[key[0]].get(stype, 0.0)
+        totals_by_month[key] = totals_by_month.get(key, 0.0) + float(days or 0) * rate
 
     monthly_allowances = {}
-
     for m in months:
-        month_num = m.month
-        year_num = m.year
-        month_name = m.strftime("%b")
-
-        records = db.query(ShiftAllowances).filter(
-            ShiftAllowances.client == client_name,
-            extract("year", ShiftAllowances.duration_month) == year_num,
-            extract("month", ShiftAllowances.duration_month) == month_num
-        ).all()
-
-        if not records:
-            monthly_allowances[month_name] = 0.0
-            continue
-
-        total_amount = Decimal(0)
-        rates = rate_map[year_num]
-
-        for row in records:
-            for mapping in row.shift_mappings:
-                stype = mapping.shift_type.strip().upper()
-                days = Decimal(mapping.days or 0)
-                rate = rates.get(stype, Decimal(0))
-                total_amount += days * rate
-
-        monthly_allowances[month_name] = float(total_amount)
+        total_amount = totals_by_month.get((m.year, m.month))
+        monthly_allowances[m.strftime("%b")] = (
+            0.0 if total_amount is None else round(total_amount, 2)
+        )
 
     client_full, client_enum = _map_client_names(client_name)
     return {
@@ -225,11 +324,17 @@ def get_graph_service(
 
 def get_all_clients_service(db: Session):
     """Fetch distinct list of all clients."""
-    clients = db.query(ShiftAllowances.client).distinct().all()
-    client_list = [c[0] for c in clients if c[0]]
-    return {"clients": client_list}
+    clients = (
+        db.query(ShiftAllowances.client)
+        .filter(ShiftAllowances.client.isnot(None), ShiftAllowances.client != "")
+        .distinct()
+        .order_by(ShiftAllowances.client)
+        .all()
+    )
+    return {"clients": [c[0] for c in clients]}
 
 
+@_cached_response
 def get_piechart_shift_summary(
     db: Session,
     start_month: str | None,
@@ -250,37 +355,8 @@ def get_piechart_shift_summary(
             if top_int <= 0:
                 raise HTTPException(400, "top must be greater than 0")
 
-    def validate_month(m: str):
-        try:
-            datetime.strptime(m, "%Y-%m")
-            return True
-        except:
-            return False
-
-    def generate_months(start_m: str, end_m: str):
-        result = []
-        cur = datetime.strptime(start_m, "%Y-%m")
-        end = datetime.strptime(end_m, "%Y-%m")
-        while cur <= end:
-            result.append(cur.strftime("%Y-%m"))
-            cur += relativedelta(months=1)
-        return result
-
     if not start_month and not end_month:
-        check_month = datetime.now().strftime("%Y-%m")
-        months = None
-        for _ in range(12):
-            exists = (
-                db.query(ShiftAllowances)
-                .filter(func.to_char(ShiftAllowances.duration_month, 'YYYY-MM') == check_month)
-                .first()
-            )
-            if exists:
-                months = [check_month]
-                break
-            check_month = (
-                datetime.strptime(check_month, "%Y-%m") - relativedelta(months=1)
-            ).strftime("%Y-%m")
+        months = _latest_data_month(db)
         if not months:
             raise HTTPException(
                 status_code=404,
@@ -288,7 +364,7 @@ def get_piechart_shift_summary(
             )
 
     elif start_month and not end_month:
-        if not validate_month(start_month):
+        if not _validate_ym(start_month):
             raise HTTPException(400, "start_month must be in YYYY-MM format")
         months = [start_month]
 
@@ -296,66 +372,77 @@ def get_piechart_shift_summary(
         raise HTTPException(400, "start_month is required if end_month is provided")
 
     else:
-        if not validate_month(start_month) or not validate_month(end_month):
+        if not _validate_ym(start_month) or not _validate_ym(end_month):
             raise HTTPException(400, "Months must be in YYYY-MM format")
         if end_month < start_month:
             raise HTTPException(400, "end_month cannot be less than start_month")
-        months = generate_months(start_month, end_month)
+        months = _generate_months(start_month, end_month)
 
-    rate_rows = db.query(ShiftsAmount).all()
-    rates = {r.shift_type.upper(): float(r.amount) for r in rate_rows}
+    month_filters = _month_span_filters(months)
+    client_key = _client_key()
 
-    combined = {}
-    for m in months:
-        year, month = map(int, m.split("-"))
-        records = (
-            db.query(ShiftAllowances)
-            .filter(
-                extract("year", ShiftAllowances.duration_month) == year,
-                extract("month", ShiftAllowances.duration_month) == month
-            )
-            .all()
-        )
-        for row in records:
-            client_real = row.client or "Unknown"
-
-            client_full, client_enum = _map_client_names(client_real)
-
-            if client_enum not in combined:
-                combined[client_enum] = {
-                    "client_full_name": client_full,
-                    "client_enum": client_enum,
-                    "employees": set(),
-                    "shift_a": 0,
-                    "shift_b": 0,
-                    "shift_c": 0,
-                    "prime": 0,
-                    "total_allowances": 0
-                }
-
-            combined[client_enum]["employees"].add(row.emp_id)
-
-            for mapping in row.shift_mappings:
-                stype = mapping.shift_type.upper()
-                days = int(mapping.days or 0)
+    # Distinct (client, employee) pairs, in order of first appearance.
+    employee_rows = (
+        db.query(client_key, ShiftAllowances.emp_id)
+        .filter(*month_filters)
+        .group_by(client_key, ShiftAllowances.emp_id)
+        .order_by(func.min(ShiftAllowances.id))
+        .all()
+    )
 
-                if stype == "A":
-                    combined[client_enum]["shift_a"] += days
-                elif stype == "B":
-                    combined[client_enum]["shift_b"] += days
-                elif stype == "C":
-                    combined[client_enum]["shift_c"] += days
-                elif stype == "PRIME":
-                    combined[client_enum]["prime"] += days
+    combined = {}
+    for client_real, emp_id in employee_rows:
+        client_full, client_enum = _map_client_names(client_real)
+
+        if client_enum not in combined:
+            combined[client_enum] = {
+                "client_full_name": client_full,
+                "client_enum": client_enum,
+                "employees": set(),
+                "shift_a": 0,
+                "shift_b": 0,
+                "shift_c": 0,
+                "prime": 0,
+                "total_allowances": 0
+            }
 
-                combined[client_enum]["total_allowances"] += days * rates.get(stype, 0)
+        combined[client_enum]["employees"].add(emp_id)
 
+    # Every client with rows has an employee, so an empty map here means no
+    # data; stop before the days query and the rate lookup.
     if not combined:
         raise HTTPException(
             status_code=404,
             detail="No shift allowance data found for the selected month(s)"
         )
 
+    rates = {
+        shift_type.upper(): float(amount)
+        for _, shift_type, amount in get_rate_rows(db)
+    }
+
+    # Mappings are counted per distinct days value so the whole-day
+    # truncation still applies per mapping, not to the summed days.
+    shift_type = func.upper(ShiftMapping.shift_type)
+    day_rows = (
+        db.query(client_key, shift_type, ShiftMapping.days, func.count())
+        .join(ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id)
+        .filter(*month_filters)
+        .group_by(client_key, shift_type, ShiftMapping.days)
+        .all()
+    )
+
+    for client_real, stype, mapping_days, count in day_rows:
+        client_enum = _map_client_names(client_real)[1]
+        days = int(mapping_days or 0) * count
+
+        info = combined[client_enum]
+        bucket = _PIE_BUCKET.get(stype)
+        if bucket:
+            info[bucket] += days
+
+        info["total_allowances"] += days * rates.get(stype, 0)
+
     result = []
     for _key, info in combined.items():
         total_days = (
@@ -385,6 +472,7 @@ def get_piechart_shift_summary(
     return result
 
 
+@_cached_response
 def get_vertical_bar_service(
     db: Session,
     start_month: str | None = None,
@@ -406,44 +494,14 @@ def get_vertical_bar_service(
             if top_int <= 0:
                 raise HTTPException(400, "top must be greater than 0")
 
-    def validate_month_format(m: str):
-        try:
-            datetime.strptime(m, "%Y-%m")
-            return True
-        except ValueError:
-            return False
-
-    def generate_months_list(start_m: str, end_m: str):
-        result = []
-        cur = datetime.strptime(start_m, "%Y-%m")
-        end = datetime.strptime(end_m, "%Y-%m")
-        while cur <= end:
-            result.append(cur.strftime("%Y-%m"))
-            cur += relativedelta(months=1)
-        return result
-
     if not start_month and not end_month:
-        check_month = datetime.now().strftime("%Y-%m")
-        months = None
-
-        for _ in range(12):
-            exists = db.query(ShiftAllowances).filter(
-                func.to_char(ShiftAllowances.duration_month, 'YYYY-MM') == check_month
-            ).first()
-
-            if exists:
-                months = [check_month]
-                break
-
-            check_month = (
-                datetime.strptime(check_month, "%Y-%m") - relativedelta(months=1)
-            ).strftime("%Y-%m")
+        months = _latest_data_month(db)
 
         if not months:
             raise HTTPException(404, "No shift allowance data found for the last 12 months")
 
     elif start_month and not end_month:
-        if not validate_month_format(start_month):
+        if not _validate_ym(start_month):
             raise HTTPException(400, "start_month must be in YYYY-MM format")
         months = [start_month]
 
@@ -451,50 +509,62 @@ def get_vertical_bar_service(
         raise HTTPException(400, "start_month is required if end_month is provided")
 
     else:
-        if not validate_month_format(start_month) or not validate_month_format(end_month):
+        if not _validate_ym(start_month) or not _validate_ym(end_month):
             raise HTTPException(400, "Months must be in YYYY-MM format")
 
         if end_month < start_month:
             raise HTTPException(400, "end_month cannot be less than start_month")
 
-        months = generate_months_list(start_month, end_month)
+        months = _generate_months(start_month, end_month)
 
-    rate_rows = db.query(ShiftsAmount).all()
-    rates = {r.shift_type.upper(): float(r.amount) for r in rate_rows}
+    month_filters = _month_span_filters(months)
+    client_key = _client_key()
 
-    summary = {}
+    client_rows = (
+        db.query(client_key)
+        .filter(*month_filters)
+        .group_by(client_key)
+        .order_by(func.min(ShiftAllowances.id))
+        .all()
+    )
 
-    for m in months:
-        year, month_num = map(int, m.split("-"))
+    summary = {}
 
-        records = db.query(ShiftAllowances).filter(
-            extract("year", ShiftAllowances.duration_month) == year,
-            extract("month", ShiftAllowances.duration_month) == month_num
-        ).all()
+    for (client_real,) in client_rows:
+        client_full, client_enum = _map_client_names(client_real)
+        key = client_enum
 
-        for row in records:
-            client_real = row.client or "Unknown"
+        if key not in summary:
+            summary[key] = {
+                "client_full_name": client_full,
+                "client_enum": client_enum,
+                "total_days": 0,
+                "total_allowances": 0
+            }
 
-            client_full, client_enum = _map_client_names(client_real)
-            key = client_enum
+    if not summary:
+        raise HTTPException(404, "No shift allowance data found for the selected month(s)")
 
-            if key not in summary:
-                summary[key] = {
-                    "client_full_name": client_full,
-                    "client_enum": client_enum,
-                    "total_days": 0,
-                    "total_allowances": 0
-                }
+    rates = {
+        shift_type.upper(): float(amount)
+        for _, shift_type, amount in get_rate_rows(db)
+    }
 
-            for mapping in row.shift_mappings:
-                stype = mapping.shift_type.upper()
-                days = float(mapping.days or 0)
+    shift_type = func.upper(ShiftMapping.shift_type)
+    day_rows = (
+        db.query(client_key, shift_type, func.sum(ShiftMapping.days))
+        .join(ShiftMapping, ShiftMapping.shiftallowance_id == ShiftAllowances.id)
+        .filter(*month_filters)
+        .group_by(client_key, shift_type)
+        .all()
+    )
 
-                summary[key]["total_days"] += days
-                summary[key]["total_allowances"] += days * rates.get(stype, 0)
+    for client_real, stype, total_days in day_rows:
+        key = _map_client_names(client_real)[1]
+        days = float(total_days or 0)
 
-    if not summary:
-        raise HTTPException(404, "No shift allowance data found for the selected month(s)")
+        summary[key]["total_days"] += days
+        summary[key]["total_allowances"] += days * rates.get(stype, 0)
 
     result = []
     for key, info in summary.items():
@@ -527,6 +597,17 @@ QUARTER_MAP = {
 
 SHIFT_TYPES = ["A", "B", "C", "PRIME"]
 
+# Pie chart field that accumulates each shift type's days.
+_PIE_BUCKET = {"A": "shift_a", "B": "shift_b", "C": "shift_c", "PRIME": "prime"}
+
+# Spellings of each shift type as stored, mapped to the canonical code, so
+# per-mapping loops do one dict lookup and only strip/upper the odd value.
+_STYPE_NORM = {
+    variant: s
+    for s in SHIFT_TYPES
+    for variant in (s, s.lower(), s.capitalize())
+}
+
 
 def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
     """Generate hierarchical dashboard summary grouped by client, department, and account manager."""
@@ -555,14 +636,21 @@ def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
             filters.append(ShiftAllowances.duration_month == start)
 
     elif payload.selected_year:
-        filters.append(
-            extract("year", ShiftAllowances.duration_month) == payload.selected_year
-        )
+        # duration_month is stored as the first of its month, so the year is
+        # a half-open range and month picks are plain date equality; both
+        # stay sargable on the duration_month indexes.
+        year = payload.selected_year
+        filters.append(ShiftAllowances.duration_month >= date(year, 1, 1))
+        filters.append(ShiftAllowances.duration_month < date(year + 1, 1, 1))
+
+        def month_starts(months):
+            return [date(year, m, 1) for m in months if 1 <= m <= 12]
 
         if payload.selected_months:
             filters.append(
-                extract("month", ShiftAllowances.duration_month)
-                .in_([int(m) for m in payload.selected_months])
+                ShiftAllowances.duration_month.in_(
+                    month_starts(int(m) for m in payload.selected_months)
+                )
             )
 
         if payload.selected_quarters:
@@ -570,8 +658,7 @@ def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
             for q in payload.selected_quarters:
                 quarter_months.update(QUARTER_MAP[q])
             filters.append(
-                extract("month", ShiftAllowances.duration_month)
-                .in_(quarter_months)
+                ShiftAllowances.duration_month.in_(month_starts(sorted(quarter_months)))
             )
 
     # -------------------- FETCH REAL DEPARTMENTS --------------------
@@ -636,9 +723,7 @@ def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
     if filters:
         q = q.filter(*filters)
 
-    rows = q.all()
-    if not rows:
-        return {"dashboard": {}}
+    rows = q.yield_per(ROW_BATCH_SIZE)
 
     # -------------------- DASHBOARD INIT --------------------
     dashboard = {
@@ -650,7 +735,9 @@ def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
     }
 
     # -------------------- ACCUMULATION --------------------
+    has_rows = False
     for emp_id, client, dept, am, shift, days, amount in rows:
+        has_rows = True
 
         # SAFETY: ignore unexpected data instead of crashing
         if dept not in all_departments:
@@ -703,6 +790,9 @@ def get_client_dashboard_summary(db: Session, payload: DashboardFilterRequest):
         am_dept[f"shift_{shift}"]["total"] += allowance
         am_dept[f"shift_{shift}"]["head_count"].add(emp_id)
 
+    if not has_rows:
+        return {"dashboard": {}}
+
     # -------------------- FINALIZE COUNTS --------------------
     def finalize(node):
         node["head_count"] = len(node["head_count"])
@@ -0,0 +1,20 @@
+"""Version counter for the shift data behind cached responses."""
+
+from diskcache import Cache
+
+# Kept on disk so every worker process on the host sees the same value.
+_store = Cache("./diskcache/data_version")
+DATA_VERSION_KEY = "shift_data:version"
+
+
+def current_data_version() -> int:
+    """Return the current shift data version; cached responses key on it."""
+    return _store.get(DATA_VERSION_KEY, 0)
+
+
+def bump_data_version() -> int:
+    """
+    Mark cached responses and rates as stale. Call after committing any
+    write to shift_allowances, shift_mapping or shifts_amount.
+    """
+    return _store.incr(DATA_VERSION_KEY, default=0)
@@ -1,108 +1,138 @@
 from fastapi import HTTPException
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import extract, func
-from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func
+from models.models import ShiftAllowances, ShiftMapping
+from services.data_version import bump_data_version
+from services.rates_cache import get_rate_rows
 from datetime import datetime,date
 from typing import Optional
-import pandas as pd
 from io import BytesIO
+from openpyxl import Workbook
 from fastapi.responses import StreamingResponse
-from utils.client_enums import Company
+from utils.client_enums import company_names
+from utils.months import YM_RE
 from calendar import monthrange
 from diskcache import Cache
 
 cache = Cache("./diskcache/latest_month")
 LATEST_MONTH_KEY = "client_summary:latest_month"
 
+_ALLOWED_FIELDS = frozenset(("shift_a", "shift_b", "shift_c", "prime"))
+_SHIFT_MAP = {
+    "shift_a": "A",
+    "shift_b": "B",
+    "shift_c": "C",
+    "prime": "PRIME"
+}
+_EXCEL_COLUMNS = (
+    "id", "emp_id", "emp_name", "grade", "department", "client",
+    "project", "project_code", "account_manager", "practice_lead",
+    "delivery_manager", "duration_month", "payroll_month",
+    "billability_status", "practice_remarks", "rmg_comments",
+    "created_at", "updated_at", "total_allowance", "A", "B", "C", "PRIME"
+)
+
 def is_latest_month(db: Session, duration_dt: date) -> bool:
     latest_month = db.query(func.max(ShiftAllowances.duration_month)).scalar()
     if not latest_month:
         return False
     return latest_month.year == duration_dt.year and latest_month.month == duration_dt.month
 
+def _parse_month(value: str) -> date:
+    """Parse YYYY-MM into the first of that month; ValueError otherwise."""
+    match = YM_RE.fullmatch(value)
+    if not match:
+        raise ValueError(f"not a YYYY-MM month: {value!r}")
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+def _month_bounds(month_start: date):
+    """Return the half-open [first of month, first of next month) range."""
+    if month_start.month == 12:
+        return month_start, date(month_start.year + 1, 1, 1)
+    return month_start, date(month_start.year, month_start.month + 1, 1)
+
 def _load_shift_rates(db: Session) -> dict:
     """Return dict like {'A': 300.0, 'B': 350.0, ...}"""
-    rows = db.query(ShiftsAmount).all()
     rates = {}
-    for r in rows:
-        if not r.shift_type:
+    for _, shift_type, amount in get_rate_rows(db):
+        if not shift_type:
             continue
-        rates[r.shift_type.upper()] = float(r.amount)
+        rates[shift_type.upper()] = float(amount)
     return rates
 
-def _recalculate_all_mappings(db: Session):
-    """Recalculate total_allowance for ALL shift_mapping rows."""
-    rates = _load_shift_rates(db)
-
-    rows = db.query(ShiftMapping).all()
-    for row in rows:
-        days = float(row.days or 0)
-        rate = rates.get(row.shift_type.upper(), 0.0)
-        row.total_allowance = days * rate
-
-    db.commit()
-
-
 def fetch_shift_data(db: Session, start: int, limit: int):
     """Fetch paginated shift records for the latest available duration month."""
-    current_month = datetime.now().strftime("%Y-%m")
-
-    has_current = (
-        db.query(ShiftAllowances)
-        .filter(func.to_char(ShiftAllowances.duration_month, "YYYY-MM") == current_month)
-        .first()
-    )
+    current_start = date.today().replace(day=1)
+    current_month = current_start.strftime("%Y-%m")
+    current_lo, current_hi = _month_bounds(current_start)
+
+    # One round trip answers both "is there data this month?" and "what is
+    # the latest month with data?".
+    has_current, latest = db.query(
+        db.query(ShiftAllowances.id)
+        .filter(
+            ShiftAllowances.duration_month >= current_lo,
+            ShiftAllowances.duration_month < current_hi,
+        )
+        .exists(),
+        func.max(ShiftAllowances.duration_month),
+    ).one()
 
     if has_current:
-        selected_month = current_month
+        selected_start = current_start
         message = None
     else:
-        latest = (
-            db.query(func.to_char(ShiftAllowances.duration_month, "YYYY-MM"))
-            .order_by(func.to_char(ShiftAllowances.duration_month, "YYYY-MM").desc())
-            .first()
-        )
         if not latest:
             raise HTTPException(status_code=404, detail="No shift data is available.")
-        selected_month = latest[0]
+        selected_start = latest.replace(day=1)
         message = f"No data found for current month {current_month}"
+    selected_month = selected_start.strftime("%Y-%m")
 
     rates = _load_shift_rates(db)
 
-    _recalculate_all_mappings(db)
-
-    base_q = (
-        db.query(ShiftAllowances)
-        .options(joinedload(ShiftAllowances.shift_mappings))
-        .filter(func.to_char(ShiftAllowances.duration_month, "YYYY-MM") == selected_month)
+    month_lo, month_hi = _month_bounds(selected_start)
+    month_filter = (
+        ShiftAllowances.duration_month >= month_lo,
+        ShiftAllowances.duration_month < month_hi,
     )
 
-    total_records = base_q.count()
-    records = base_q.order_by(ShiftAllowances.id.asc()).offset(start).limit(limit).all()
+    # The window count rides along with the page, so one query returns both
+    # the rows and the month's total.
+    page = (
+        db.query(ShiftAllowances, func.count().over())
+        .options(selectinload(ShiftAllowances.shift_mappings))
+        .filter(*month_filter)
+        .order_by(ShiftAllowances.id.asc())
+        .offset(start)
+        .limit(limit)
+        .all()
+    )
+    if page:
+        total_records = page[0][1]
+    else:
+        # A page past the end carries no window row to read the total from.
+        total_records = (
+            db.query(func.count(ShiftAllowances.id)).filter(*month_filter).scalar()
+        )
 
     result = []
-    for rec in records:
+    for rec, _ in page:
 
         mappings = rec.shift_mappings or []
 
         shift_details = {}
         total_allowance = 0.0
 
+        # Priced for the response only; this read path never writes back.
         for m in mappings:
             days = float(m.days or 0)
             rate = rates.get(m.shift_type.upper(), 0.0)
-            m.total_allowance = days * rate
-            total_allowance += m.total_allowance
+            total_allowance += days * rate
 
             if days > 0:
                 shift_details[m.shift_type.upper()] = days
 
-        db.commit()
-
-        client_name = rec.client
-        abbr = next((c.name for c in Company if c.value == client_name), None)
-        if abbr:
-            client_name = abbr
+        client_name = company_names(rec.client)[1]
 
         result.append({
             "id": rec.id,
@@ -134,7 +164,7 @@ def parse_shift_value(value):
 
     try:
         v = float(value)
-    except Exception:
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=400,
             detail=f"Invalid shift value '{value}'. Only numeric allowed."
@@ -186,8 +216,7 @@ def update_shift_service(
     duration_month: Optional[str] = None
 ):
     """Update shift days for an employee and recalculate allowances."""
-    allowed_fields = ["shift_a", "shift_b", "shift_c", "prime"]
-    unknown = [k for k in updates if k not in allowed_fields]
+    unknown = [k for k in updates if k not in _ALLOWED_FIELDS]
     if unknown:
         raise HTTPException(
             status_code=400,
@@ -200,24 +229,16 @@ def update_shift_service(
         validate_half_day(val, k)
         parsed[k] = val
 
-    key_map = {
-        "shift_a": "A",
-        "shift_b": "B",
-        "shift_c": "C",
-        "prime": "PRIME"
-    }
-
-
     mapped_updates = {
-        key_map[k]: (parsed[k] if parsed[k] is not None else 0.0)
+        _SHIFT_MAP[k]: (parsed[k] if parsed[k] is not None else 0.0)
         for k in parsed
     }
 
 
 
     try:
-        payroll_dt = datetime.strptime(payroll_month, "%Y-%m").date().replace(day=1)
-    except Exception:
+        payroll_dt = _parse_month(payroll_month)
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=400,
             detail="Invalid payroll_month format. Use YYYY-MM"
@@ -230,8 +251,8 @@ def update_shift_service(
         )
 
     try:
-        duration_dt = datetime.strptime(duration_month, "%Y-%m").date().replace(day=1)
-    except Exception:
+        duration_dt = _parse_month(duration_month)
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=400,
             detail="Invalid duration_month format. Use YYYY-MM"
@@ -266,10 +287,11 @@ def update_shift_service(
         )
 
 
+    month_lo, month_hi = _month_bounds(duration_dt)
     q = db.query(ShiftAllowances).filter(
         ShiftAllowances.emp_id == emp_id,
-        extract("year", ShiftAllowances.duration_month) == duration_dt.year,
-        extract("month", ShiftAllowances.duration_month) == duration_dt.month
+        ShiftAllowances.duration_month >= month_lo,
+        ShiftAllowances.duration_month < month_hi
     )
 
     rec = q.first()
@@ -281,38 +303,36 @@ def update_shift_service(
 
 
     rates = _load_shift_rates(db)
-    existing = {m.shift_type.upper(): m for m in rec.shift_mappings or []}
+    mappings = list(rec.shift_mappings or [])
+    existing = {m.shift_type.upper(): m for m in mappings}
 
+    new_maps = []
     for stype, days in mapped_updates.items():
         if stype in existing:
-            mapping = existing[stype]
-            mapping.days = days
+            existing[stype].days = days
         else:
             mapping = ShiftMapping(
                 shiftallowance_id=rec.id,
                 shift_type=stype,
-                days=days,
-                total_allowance=0.0
+                days=days
             )
-            db.add(mapping)
+            new_maps.append(mapping)
             existing[stype] = mapping
+    db.add_all(new_maps)
 
-        rate = rates.get(stype, 0.0)
-        mapping.total_allowance = float(days) * rate
-    rec.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(rec)
-
-
+    # One pass prices every mapping of the record, edited or not, enforces
+    # the month's day limit and builds the response, all before the single
+    # commit so a rejected update is never persisted.
     total_days = 0.0
     total_allowance = 0.0
     details = []
 
-    for m in rec.shift_mappings:
+    for m in sorted(mappings + new_maps, key=lambda m: m.shift_type.upper()):
         days = float(m.days or 0)
         total_days += days
 
         if total_days > max_days_in_month:
+            db.rollback()
             raise HTTPException(
                 status_code=400,
                 detail=(
@@ -321,17 +341,20 @@ def update_shift_service(
                 )
             )
 
-        rate = rates.get(m.shift_type.upper(), 0.0)
-        m.total_allowance = float(days) * rate
+        stype = m.shift_type.upper()
+        m.total_allowance = days * rates.get(stype, 0.0)
         total_allowance += m.total_allowance
 
         details.append({
-            "shift": m.shift_type.upper(),
+            "shift": stype,
             "days": days,
-            "total": float(m.total_allowance)
+            "total": m.total_allowance
         })
 
+    rec.updated_at = datetime.utcnow()
     db.commit()
+    bump_data_version()
+
     if is_latest_month(db, duration_dt):
         cache.pop(LATEST_MONTH_KEY, None)
 
@@ -347,9 +370,9 @@ def update_shift_service(
 def fetch_shift_record(emp_id: str, duration_month: str, payroll_month: str, db: Session):
     """Fetch a single employee shift record with allowance breakdown."""
     try:
-        duration_dt = datetime.strptime(duration_month + "-01", "%Y-%m-%d").date()
-        payroll_dt = datetime.strptime(payroll_month + "-01", "%Y-%m-%d").date()
-    except:
+        duration_dt = _parse_month(duration_month)
+        payroll_dt = _parse_month(payroll_month)
+    except (TypeError, ValueError):
         raise HTTPException(status_code=400, detail="Invalid month format. Expected YYYY-MM")
 
     rec = (
@@ -384,7 +407,7 @@ def fetch_shift_record(emp_id: str, duration_month: str, payroll_month: str, db:
         "emp_name": rec.emp_name,
         "grade": rec.grade,
         "department": rec.department,
-        "client": next((c.name for c in Company if c.value == rec.client), rec.client),
+        "client": company_names(rec.client)[1],
         "project": rec.project,
         "project_code": rec.project_code,
         "account_manager": rec.account_manager,
@@ -410,41 +433,28 @@ def generate_employee_shift_excel(emp_id: str,
     rec = fetch_shift_record(emp_id, duration_month, payroll_month, db)
 
     if rec.get("duration_month"):
-        rec["duration_month"] = datetime.strptime(rec["duration_month"], "%Y-%m").strftime("%b'%y")
+        rec["duration_month"] = _parse_month(rec["duration_month"]).strftime("%b'%y")
     if rec.get("payroll_month"):
-        rec["payroll_month"] = datetime.strptime(rec["payroll_month"], "%Y-%m").strftime("%b'%y")
-
-    df = pd.DataFrame([rec])
-
-    columns = [
-        "id", "emp_id", "emp_name", "grade", "department", "client",
-        "project", "project_code", "account_manager", "practice_lead",
-        "delivery_manager", "duration_month", "payroll_month",
-        "billability_status", "practice_remarks", "rmg_comments",
-        "created_at", "updated_at", "total_allowance", "A", "B", "C", "PRIME"
-    ]
-
-    for c in columns:
-        if c not in df.columns:
-            df[c] = None
-
-    df = df[columns]
-
+        rec["payroll_month"] = _parse_month(rec["payroll_month"]).strftime("%b'%y")
 
     def format_inr(v):
         try:
             formatted = f"₹ {float(v):,.2f}"
             return formatted.replace("'", "")
-        except:
+        except (TypeError, ValueError):
             return v
 
-    df["total_allowance"] = df["total_allowance"].apply(format_inr)
+    rec["total_allowance"] = format_inr(rec.get("total_allowance"))
 
+    # A single record needs no DataFrame; a write-only workbook streams the
+    # header and the row straight to the buffer.
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Shift Details")
+    ws.append(list(_EXCEL_COLUMNS))
+    ws.append([rec.get(c) for c in _EXCEL_COLUMNS])
 
     output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Shift Details")
-
+    wb.save(output)
     output.seek(0)
     filename = f"{emp_id}_{duration_month}_{payroll_month}_shift_details.xlsx"
 
@@ -8,6 +8,8 @@ from fastapi import HTTPException
 from dateutil.relativedelta import relativedelta
 from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
 
+SHIFT_LABELS = {"A": "A", "B": "B", "C": "C", "PRIME": "PRIME"}
+
 def export_filtered_excel(
     db: Session,
     emp_id: str | None = None,
@@ -25,8 +27,6 @@ def export_filtered_excel(
     available month within the last 12 months is used.
     """
 
-    SHIFT_LABELS = {"A": "A", "B": "B", "C": "C", "PRIME": "PRIME"}
-
     base_query = (
         db.query(
             ShiftAllowances.id,
@@ -11,13 +11,13 @@ continuous month-to-month visibility is required, even when data for
 certain months is unavailable.
 """
 
-import re
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from models.models import ShiftAllowances
 from services.summary_service import get_client_shift_summary
+from utils.months import YM_STRICT_RE
 
 
 def get_interval_summary_service(
@@ -73,7 +73,7 @@ def get_interval_summary_service(
         if " " in start_month:
             raise HTTPException(status_code=400, detail="Spaces are not allowed in start_month")
 
-        if not re.match(r"^\d{4}-\d{2}$", start_month):
+        if not YM_STRICT_RE.fullmatch(start_month):
             raise HTTPException(status_code=400, detail="Invalid start_month format. Use YYYY-MM")
 
         # DO NOT CHECK IF MONTH EXISTS — interval will handle missing months
@@ -83,7 +83,7 @@ def get_interval_summary_service(
     # END MONTH VALIDATION
 
     if end_month:
-        if not re.match(r"^\d{4}-\d{2}$", end_month):
+        if not YM_STRICT_RE.fullmatch(end_month):
             raise HTTPException(status_code=400, detail="Invalid end_month format. Use YYYY-MM")
 
 
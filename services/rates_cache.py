@@ -0,0 +1,59 @@
+"""Process-wide cache of the ShiftsAmount rate table."""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.models import ShiftsAmount
+from services.data_version import current_data_version
+
+RATES_TTL_SECONDS = 300
+
+_lock = threading.Lock()
+_cache = {"loaded_at": None, "version": None, "rows": []}
+
+
+def get_rate_rows(db: Session, ttl: int = RATES_TTL_SECONDS) -> List[Tuple]:
+    """
+    Return (payroll_year, shift_type, amount) for every configured rate.
+
+    Rates change rarely, so the table is read at most once per `ttl` seconds
+    per process, and again whenever bump_data_version() has been called
+    since the last read. Pass ttl=0 to always read the table.
+    """
+    version = current_data_version()
+    with _lock:
+        loaded_at = _cache["loaded_at"]
+        if (
+            loaded_at is None
+            or _cache["version"] != version
+            or time.monotonic() - loaded_at >= ttl
+        ):
+            _cache["rows"] = [
+                tuple(row)
+                for row in db.query(
+                    ShiftsAmount.payroll_year,
+                    ShiftsAmount.shift_type,
+                    ShiftsAmount.amount,
+                ).all()
+            ]
+            _cache["loaded_at"] = time.monotonic()
+            _cache["version"] = version
+        return _cache["rows"]
+
+
+def load_shift_amounts(db: Session) -> Dict[tuple, float]:
+    """Return {(payroll_year, shift_type): amount} for every configured rate."""
+    return {
+        (str(payroll_year).strip(), shift_type): float(amount or 0)
+        for payroll_year, shift_type, amount in get_rate_rows(db)
+    }
+
+
+def invalidate_rates() -> None:
+    """Drop the cached rate table so the next lookup re-reads it."""
+    with _lock:
+        _cache["loaded_at"] = None
+        _cache["rows"] = []
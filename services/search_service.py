@@ -15,7 +15,15 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 from models.models import ShiftAllowances, ShiftMapping, ShiftsAmount
-from utils.client_enums import Company
+from utils.client_enums import Company, company_names
+
+
+SHIFT_LABELS = {
+    "A": "A(9PM to 6AM)",
+    "B": "B(4PM to 1AM)",
+    "C": "C(6AM to 3PM)",
+    "PRIME": "PRIME(12AM to 9AM)",
+}
 
 def validate_not_future_month(month_str: str, field_name: str):
     """Validate YYYY-MM format and ensure month is not in the future."""
@@ -190,14 +198,6 @@ def export_filtered_excel(
     )
 
 
-    SHIFT_LABELS = {
-        "A": "A(9PM to 6AM)",
-        "B": "B(4PM to 1AM)",
-        "C": "C(6AM to 3PM)",
-        "PRIME": "PRIME(12AM to 9AM)",
-    }
-
-
     overall_shift_details = {v: 0.0 for v in SHIFT_LABELS.values()}
     overall_total_allowance = 0.0
 
@@ -249,9 +249,7 @@ def export_filtered_excel(
         }
         d["total_allowance"] = round(emp_total, 2)
 
-        abbr = next((c.name for c in Company if c.value == d["client"]), None)
-        if abbr:
-            d["client"] = abbr
+        d["client"] = company_names(d["client"])[1]
 
         employees.append(d)
 
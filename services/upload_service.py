@@ -14,8 +14,10 @@ import pandas as pd
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 import json
-from models.models import UploadedFiles, ShiftAllowances, ShiftMapping, ShiftsAmount
+from models.models import UploadedFiles, ShiftAllowances, ShiftMapping
 from schemas.displayschema import CorrectedRow
+from services.data_version import bump_data_version
+from services.rates_cache import get_rate_rows
 from utils.enums import ExcelColumnMap
 
 
@@ -79,9 +81,9 @@ def parse_month_format(value: str):
 
 def load_shift_rates(db: Session) -> dict:
     rates = {}
-    for r in db.query(ShiftsAmount).all():
-        if r.shift_type:
-            rates[r.shift_type.upper()] = float(r.amount or 0)
+    for _, shift_type, amount in get_rate_rows(db):
+        if shift_type:
+            rates[shift_type.upper()] = float(amount or 0)
     return rates
 
 
@@ -297,6 +299,7 @@ async def process_excel_upload(file, db: Session, user, base_url: str):
             inserted += 1
 
         db.commit()
+        bump_data_version()
         if should_invalidate_latest_month_cache(excel_duration_months):
             cache.pop(LATEST_MONTH_KEY, None)
 
@@ -409,14 +412,6 @@ def days_in_month(month_date: date) -> int:
     return calendar.monthrange(month_date.year, month_date.month)[1]
 
 
-def load_shift_rates(db: Session) -> dict:
-    rates = {}
-    rows = db.query(ShiftsAmount).all()
-    for r in rows:
-        if r.shift_type:
-            rates[r.shift_type.upper()] = float(r.amount or 0)
-    return rates
-
 def update_corrected_rows(db: Session, corrected_rows: List[CorrectedRow]):
     if not corrected_rows:
         raise HTTPException(400, "No corrected rows provided")
@@ -536,6 +531,7 @@ def update_corrected_rows(db: Session, corrected_rows: List[CorrectedRow]):
         )
 
     db.commit()
+    bump_data_version()
 
     if should_invalidate_latest_month_cache(corrected_months):
         cache.pop(LATEST_MONTH_KEY, None)
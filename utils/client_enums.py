@@ -67,6 +67,21 @@ class Company(Enum):
     DELEK="Delek US Holdings Inc"
 
 
+# Company value or name -> (value, name). Filled in reverse so that, as in
+# a front-to-back scan, the first matching member wins.
+COMPANY_LOOKUP = {}
+for _c in reversed(list(Company)):
+    COMPANY_LOOKUP[_c.value] = COMPANY_LOOKUP[_c.name] = (_c.value, _c.name)
+del _c
+
+
+def company_names(client: str) -> tuple:
+    """
+    Return (full name, enum name) for a stored client, which may be either.
+    Clients that are not a Company member map to themselves.
+    """
+    return COMPANY_LOOKUP.get(client, (client, client))
+
 
 def _oklch_to_hex(L_pct: float, C: float, h: float) -> str:
     """
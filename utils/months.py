@@ -0,0 +1,11 @@
+"""Shared YYYY-MM month string patterns."""
+
+import re
+
+# Matches what strptime("%Y-%m") accepted, without its per-call format
+# parsing; use with fullmatch().
+YM_RE = re.compile(r"(\d{4})-(\d{1,2})")
+
+# Strict YYYY-MM with a two-digit month, for inputs that must be written
+# exactly that way; use with fullmatch().
+YM_STRICT_RE = re.compile(r"(\d{4})-(\d{2})")